@@ -0,0 +1,118 @@
+"""In-process cache of contacts.
+
+Events formatted together often share the same few contacts, so instead of
+querying contacts for every event we keep those in memory.
+
+A contact is dropped when modified via API in this process, changes done
+elsewhere are picked up once the cached contact is older than
+``CONTACTS_CACHE_TTL`` seconds.
+"""
+
+import time
+
+from types import MappingProxyType
+from typing import Dict, Iterable, Mapping, Optional
+from flask import current_app as app
+from superdesk import get_resource_service
+
+from ntb.cache import LRUCache
+
+TTL_CONFIG_KEY = "CONTACTS_CACHE_TTL"
+DEFAULT_TTL = 60  # seconds
+MAXSIZE = 1000
+
+
+class ContactsCache:
+    """Contacts by ``_id``, missing ones are fetched using single query."""
+
+    def __init__(self, maxsize=MAXSIZE):
+        # str(_id) -> (fetched_at, contact)
+        self._contacts = LRUCache(maxsize=maxsize)
+
+    def get_many(self, ids: Iterable) -> Dict[str, Optional[Mapping]]:
+        """Get contacts, ``None`` for those which don't exist.
+
+        :return: contacts indexed by id converted to string
+        """
+        contacts = {}
+        missing = {}
+        now = time.monotonic()
+        ttl = self._ttl()
+        for _id in ids:
+            key = str(_id)
+            cached = self._contacts.get(key)
+            if cached is not None and now - cached[0] <= ttl:
+                contacts[key] = cached[1]
+            else:
+                missing[key] = _id
+
+        if not missing:
+            return contacts
+
+        found = {
+            str(doc["_id"]): MappingProxyType(dict(doc))
+            for doc in get_resource_service("contacts").find(
+                {"_id": {"$in": list(missing.values())}}
+            )
+        }
+        for key in missing:
+            # not found contacts are cached too, event might keep removed contact
+            contact = found.get(key)
+            self._contacts.set(key, (now, contact))
+            contacts[key] = contact
+        return contacts
+
+    def invalidate(self, _id=None) -> None:
+        if _id is None:
+            self._contacts.clear()
+        else:
+            self._contacts.pop(str(_id))
+
+    def _ttl(self) -> float:
+        return app.config.get(TTL_CONFIG_KEY, DEFAULT_TTL)
+
+
+contacts = ContactsCache()
+
+
+def preload(ids: Iterable) -> None:
+    """Fetch contacts which are not cached yet using single query."""
+    contacts.get_many(ids)
+
+
+def get_first_public(ids: Iterable) -> Optional[Mapping]:
+    """Get first public contact from ``ids``.
+
+    Contact is shared, nested values must not be modified.
+    """
+    ids = list(ids)
+    found = contacts.get_many(ids)
+    for _id in ids:
+        contact = found.get(str(_id))
+        if contact and contact.get("public"):
+            return contact
+    return None
+
+
+def invalidate(_id=None) -> None:
+    contacts.invalidate(_id)
+
+
+def _on_updated(updates, original):
+    invalidate(original.get("_id"))
+
+
+def _on_replaced(document, original):
+    invalidate(original.get("_id"))
+
+
+def _on_deleted(doc):
+    invalidate(doc.get("_id"))
+
+
+def init_app(app):
+    # new app might use other database
+    invalidate()
+    app.on_updated_contacts += _on_updated
+    app.on_replaced_contacts += _on_replaced
+    app.on_deleted_item_contacts += _on_deleted
@@ -0,0 +1,126 @@
+"""In-process cache of content profiles.
+
+Formatters need content profile schema for every item, but there are only
+a few profiles and those are rarely modified, so we keep them in memory.
+
+A profile is dropped when modified via API in this process, changes done
+elsewhere are detected by ``_etag`` poll which is done at most every
+``CONTENT_PROFILES_CACHE_TTL`` seconds.
+"""
+
+import json
+import time
+import logging
+
+from types import MappingProxyType
+from typing import Mapping, Optional
+from eve.utils import ParsedRequest
+from flask import current_app as app
+from superdesk import get_resource_service
+
+from ntb.cache import LRUCache
+
+logger = logging.getLogger(__name__)
+
+TTL_CONFIG_KEY = "CONTENT_PROFILES_CACHE_TTL"
+DEFAULT_TTL = 60  # seconds
+MAXSIZE = 50
+
+
+class ContentProfilesCache:
+    """Content profiles by ``_id``, checked for changes using ``_etag``."""
+
+    def __init__(self, maxsize=MAXSIZE):
+        # _id -> (checked_at, profile)
+        self._profiles = LRUCache(maxsize=maxsize)
+
+    def get(self, _id) -> Optional[Mapping]:
+        cached = self._profiles.get(_id)
+        if cached is None:
+            return self._load(_id)
+        checked_at, profile = cached
+        if time.monotonic() - checked_at > self._ttl():
+            return self._poll(_id, profile)
+        return profile
+
+    def invalidate(self, _id=None) -> None:
+        if _id is None:
+            self._profiles.clear()
+        else:
+            self._profiles.pop(_id)
+
+    def _ttl(self) -> float:
+        if app.config.get("SUPERDESK_TESTING"):
+            # db is reset between tests, always check the etag
+            return 0
+        return app.config.get(TTL_CONFIG_KEY, DEFAULT_TTL)
+
+    def _load(self, _id) -> Optional[Mapping]:
+        doc = get_resource_service("content_types").find_one(req=None, _id=_id)
+        profile = MappingProxyType(dict(doc)) if doc else None
+        self._profiles.set(_id, (time.monotonic(), profile))
+        return profile
+
+    def _poll(self, _id, profile) -> Optional[Mapping]:
+        req = ParsedRequest()
+        req.projection = json.dumps({"_etag": 1})
+        doc = get_resource_service("content_types").find_one(req=req, _id=_id)
+        if doc is None and profile is None:
+            self._profiles.set(_id, (time.monotonic(), None))
+            return None
+        if (
+            doc is not None
+            and profile is not None
+            and doc.get("_etag") == profile.get("_etag")
+        ):
+            self._profiles.set(_id, (time.monotonic(), profile))
+            return profile
+        logger.debug("content profile %s changed, reloading", _id)
+        return self._load(_id)
+
+
+profiles = ContentProfilesCache()
+
+
+def get_profile(_id) -> Optional[Mapping]:
+    """Get content profile, ``None`` if it doesn't exist.
+
+    Profile is shared, nested values must not be modified.
+    """
+    return profiles.get(_id)
+
+
+def get_schema(_id) -> Mapping:
+    profile = profiles.get(_id)
+    if profile is None:
+        return MappingProxyType({})
+    return profile.get("schema") or MappingProxyType({})
+
+
+def get_editor(_id) -> Mapping:
+    profile = profiles.get(_id)
+    if profile is None:
+        return MappingProxyType({})
+    return profile.get("editor") or MappingProxyType({})
+
+
+def invalidate(_id=None) -> None:
+    profiles.invalidate(_id)
+
+
+def _on_updated(updates, original):
+    invalidate(original.get("_id"))
+
+
+def _on_replaced(document, original):
+    invalidate(original.get("_id"))
+
+
+def _on_deleted(doc):
+    invalidate(doc.get("_id"))
+
+
+def init_app(app):
+    app.on_updated_content_types += _on_updated
+    app.on_replaced_content_types += _on_replaced
+    app.on_deleted_item_content_types += _on_deleted
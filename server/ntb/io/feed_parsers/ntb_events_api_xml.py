@@ -14,13 +14,14 @@ import json
 from eve.utils import ParsedRequest
 
 import superdesk
+from ntb import timezones, vocabularies
 from superdesk import text_utils
 from superdesk.errors import ParserError
 from superdesk.metadata.utils import generate_guid
 from superdesk.io.subjectcodes import get_parent_subjectcode
 from superdesk.io.feed_parsers import XMLFeedParser
 from superdesk.io.registry import register_feed_parser
-from superdesk.utc import get_date, local_to_utc, utcnow
+from superdesk.utc import utcnow
 from superdesk.metadata.item import ITEM_TYPE, CONTENT_TYPE, GUID_FIELD, FORMAT, FORMATS, GUID_NEWSML
 
 
@@ -138,7 +139,7 @@ class NTBEventsApiXMLFeedParser(XMLFeedParser):
     def _parse_datetime(self, document, tag: str) -> Optional[datetime]:
         _time = document.find(tag)
         if _time is not None and _time.text:
-            return local_to_utc(self.TZ, get_date(_time.text))
+            return timezones.to_utc(_time.text, self.TZ)
         return None
 
     def _fill_definition_short(self, document, item):
@@ -294,46 +295,32 @@ class NTBEventsApiXMLFeedParser(XMLFeedParser):
         """
         self._vocabularies = {}
 
-        req = ParsedRequest()
-        req.projection = json.dumps({'items': 1})
-
         # prefetch vocabularies -> event_calendars
-        self._vocabularies['event_calendars'] = superdesk.get_resource_service(
-            'vocabularies'
-        ).find_one(
-            req=req, _id='event_calendars'
-        ).get('items', [])
+        self._vocabularies['event_calendars'] = [
+            dict(item) for item in self._get_vocabulary_items('event_calendars')
+        ]
 
         # prefetch vocabularies -> categories
-        self._vocabularies['categories'] = superdesk.get_resource_service(
-            'vocabularies'
-        ).find_one(
-            req=req, _id='categories'
-        ).get('items', [])
+        self._vocabularies['categories'] = [
+            dict(item) for item in self._get_vocabulary_items('categories')
+        ]
 
         # prefetch vocabularies -> subject_custom
-        self._vocabularies['subject_custom'] = superdesk.get_resource_service(
-            'vocabularies'
-        ).find_one(
-            req=req, _id='subject_custom'
-        ).get('items', [])
         # use qcode as a key to speed up work with it in the future methods
-        self._vocabularies['subject_custom'] = {s['qcode']: s for s in self._vocabularies['subject_custom']}
+        self._vocabularies['subject_custom'] = {
+            s['qcode']: s for s in self._get_vocabulary_items('subject_custom')
+        }
 
         # prefetch vocabularies -> eventoccurstatus
-        req = ParsedRequest()
-        req.projection = json.dumps({
-            'items.qcode': 1,
-            'items.name': 1,
-            'items.label': 1
-        })
-        self._vocabularies['eventoccurstatus'] = superdesk.get_resource_service(
-            'vocabularies'
-        ).find_one(
-            req=req, _id='eventoccurstatus'
-        ).get('items', [])
         # use qcode as a key to speed up work with it in the future methods
-        self._vocabularies['eventoccurstatus'] = {s['qcode']: s for s in self._vocabularies['eventoccurstatus']}
+        self._vocabularies['eventoccurstatus'] = {
+            s['qcode']: {key: s[key] for key in ('qcode', 'name', 'label') if key in s}
+            for s in self._get_vocabulary_items('eventoccurstatus')
+        }
+
+    def _get_vocabulary_items(self, _id):
+        vocabulary = vocabularies.get_vocabulary(_id)
+        return vocabulary.items if vocabulary else ()
 
     def _prefetch_contacts(self):
         """
@@ -9,7 +9,7 @@
 # at https://www.sourcefabric.org/superdesk/license
 
 import logging
-from superdesk import get_resource_service
+from ntb import vocabularies
 from superdesk.io.registry import register_feed_parser
 from superdesk.errors import ParserError, SuperdeskIngestError
 from superdesk.io.feed_parsers import FeedParser
@@ -44,20 +44,17 @@ class NTBNIFSFeedParser(FeedParser):
         """Retrieve metadata according to settings, and cache values"""
         # we compute a map of subject qcode to name
         try:
-            subjects = get_resource_service('vocabularies').find_one(
-                req=None, _id='subject_custom')
+            subjects = vocabularies.get_vocabulary('subject_custom')
         except KeyError:
             return
 
         cls.subjects_map = {}
 
-        try:
-            items = subjects['items']
-        except (TypeError, KeyError):
+        if subjects is None:
             logger.error('missing "subject_custom" vocabularies')
         else:
             configured_qcodes = config.NIFS_QCODE_MAP.values()
-            for item in items:
+            for item in subjects.items:
                 qcode = item.get('qcode')
                 if qcode in configured_qcodes or qcode == MAIN_SUBJ_QCODE:
                     cls.subjects_map[qcode] = item.get('name', '')
@@ -73,13 +70,12 @@ class NTBNIFSFeedParser(FeedParser):
         :param str qcode: qcode of the item to retrieve
         :return dict: found item, or empty dict
         """
-        categories = get_resource_service('vocabularies').find_one(
-            req=None, _id=_id)
-        try:
-            return [i for i in categories['items'] if i['qcode'] == qcode][0]
-        except (TypeError, KeyError, IndexError):
+        vocabulary = vocabularies.get_vocabulary(_id)
+        item = vocabulary.get(qcode) if vocabulary else None
+        if item is None:
             logger.error('"{voc} vocabularies are missing'.format(voc=_id))
             return {}
+        return dict(item)
 
     def can_parse(self, xml):
         return True
@@ -8,9 +8,9 @@
 # AUTHORS and LICENSE files distributed with this source code, or
 # at https://www.sourcefabric.org/superdesk/license
 
-import superdesk
 from xml.etree import ElementTree as ET
 from superdesk.io.iptc import subject_codes
+from ntb import vocabularies
 
 SUBJECT_TYPE = 'tobject.subject.type'
 SUBJECT_MATTER = 'tobject.subject.matter'
@@ -22,7 +22,7 @@ SUBJECT_DETAIL = 'tobject.subject.detail'
 # TODO: move this to a NTB specific NITF module once SD-4650 is fixed
 
 def build_subject(xml):
-    voc_subjects_map = superdesk.get_resource_service('vocabularies').find_one(req=None, _id='subject_custom')
+    voc_subjects_map = vocabularies.get_vocabulary('subject_custom')
     subjects = []
     qcodes = []  # we check qcodes to avoid duplicates
     for elem in xml.findall('head/tobject/tobject.subject'):
@@ -41,12 +41,8 @@ def build_subject(xml):
             'qcode': qcode,
             'scheme': 'subject_custom',
         }
-        try:
-            voc_subject = next((s for s in voc_subjects_map['items'] if s['qcode'] == qcode))
-        except StopIteration:
-            parent = None
-        else:
-            parent = voc_subject.get('parent')
+        voc_subject = voc_subjects_map.get(qcode) if voc_subjects_map else None
+        parent = voc_subject.get('parent') if voc_subject else None
         if parent is not None:
             subject['parent'] = parent
         subjects.append(subject)
@@ -56,7 +52,7 @@ def build_subject(xml):
 def build_service(elem):
     """Fill service (anpa_category for NTB) according to vocabularies"""
     category = elem.get('content')
-    voc_categories = superdesk.get_resource_service('vocabularies').find_one(req=None, _id='categories')['items']
+    voc_categories = vocabularies.get_vocabulary('categories').items
     service = [{'name': elem.get('content')}]
     update = None
     for voc_category in voc_categories:
@@ -1,4 +1,4 @@
-import superdesk
+from ntb import vocabularies
 from superdesk.io.feed_parsers.nitf import NITFFeedParser
 from superdesk.io.registry import register_feed_parser
 from superdesk.errors import ParserError
@@ -20,7 +20,7 @@ class NTBNITFCustomFeedParser(NITFFeedParser):
     def get_place(self, xml):
         places = []
         qcodes = []
-        voc_places = superdesk.get_resource_service("vocabularies").find_one(req=None, _id="place_custom")["items"]
+        voc_places = vocabularies.get_vocabulary("place_custom").items
 
         for elem in xml.findall("head/docdata/evloc"):
             qcode = elem.attrib.get("county-dist")
@@ -28,9 +28,8 @@ class NTBNITFCustomFeedParser(NITFFeedParser):
                 qcodes.append(qcode)
 
         for place in voc_places:
-            place["scheme"] = "place_custom"
             if place.get("qcode") in qcodes or place.get("ntb_qcode") in qcodes:
-                places.append(place)
+                places.append(dict(place, scheme="place_custom"))
 
         return places
 
@@ -8,8 +8,8 @@
 # AUTHORS and LICENSE files distributed with this source code, or
 # at https://www.sourcefabric.org/superdesk/license
 
-import superdesk
 import logging
+from ntb import vocabularies
 from superdesk.io.registry import register_feed_parser
 from superdesk.errors import ParserError, SuperdeskIngestError
 from superdesk.io.feed_parsers import FeedParser
@@ -74,7 +74,7 @@ class NTBReutersFeedParser(FeedParser):
             return []
         next_subjects = []
         cv = self._get_cv("subject_custom")
-        for item in cv["items"]:
+        for item in cv.items:
             if item.get("is_active"):
                 for subject in subjects:
                     if (
@@ -103,9 +103,7 @@ class NTBReutersFeedParser(FeedParser):
         return next_subjects
 
     def _get_cv(self, _id):
-        return superdesk.get_resource_service("vocabularies").find_one(
-            req=None, _id=_id
-        )
+        return vocabularies.get_vocabulary(_id)
 
     def parse_bodyhtml(self, data):
         if data.get("bodyXhtml"):
@@ -1,5 +1,5 @@
 
-import superdesk
+from ntb import vocabularies
 
 IPTC_SPORT_PREFIX = '15'
 SPORT_CATEGORY = 'Sport'
@@ -26,7 +26,9 @@ def filter_missing_subjects(subjects):
         subjects = []
     next_subjects = []
     cv = _get_cv(SUBJECT_CV)
-    for item in cv['items']:
+    if not cv:
+        return next_subjects
+    for item in cv.items:
         if item.get('is_active'):
             for subject in subjects:
                 if item.get('qcode') == subject.get('qcode'):
@@ -44,7 +46,7 @@ def set_default_service(article):
     cv = _get_cv(SERVICE_CV)
     if not cv:
         return
-    active_items = [item for item in cv.get('items', []) if item.get('is_active')]
+    active_items = [item for item in cv.items if item.get('is_active')]
     if active_items:
         service = active_items[0]
         for item in active_items:
@@ -60,4 +62,4 @@ def set_default_service(article):
 
 
 def _get_cv(_id):
-    return superdesk.get_resource_service('vocabularies').find_one(req=None, _id=_id)
+    return vocabularies.get_vocabulary(_id)
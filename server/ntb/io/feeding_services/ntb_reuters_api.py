@@ -11,7 +11,12 @@
 import superdesk
 import logging
 import datetime
+import heapq
 import requests
+import time
+from concurrent.futures import ThreadPoolExecutor
+from flask import current_app as app
+from requests.adapters import HTTPAdapter
 from superdesk.errors import IngestApiError
 import json
 from superdesk.io.registry import (
@@ -19,6 +24,7 @@ from superdesk.io.registry import (
     register_feeding_service_parser,
 )
 from superdesk.io.feeding_services.http_service import HTTPFeedingService
+from ntb.io.feeding_services import oauth
 
 logger = logging.getLogger(__name__)
 
@@ -41,6 +47,18 @@ class NTBReutersHTTPFeedingService(HTTPFeedingService):
 
     label = "NTB Reuters feed API"
 
+    DEFAULT_URL = "https://api.reutersconnect.com/content/graphql"
+    DEFAULT_AUTH_URL = "https://auth.thomsonreuters.com/oauth/token"
+
+    DEFAULT_PARALLELISM = 5
+    DEFAULT_BATCH_SIZE = 10
+    HTTP_TIMEOUT = 30
+    RETRY_STATUSES = frozenset([429, 500, 502, 503, 504])
+    MAX_RETRIES = 3
+    RETRY_BACKOFF = 1  # seconds, doubled with every retry
+    SEEN_TTL = datetime.timedelta(days=1)
+    MAX_SEEN = 5000  # seen items kept in provider, most recently seen first
+
     fields = [
         {
             "id": "client_id",
@@ -77,35 +95,56 @@ class NTBReutersHTTPFeedingService(HTTPFeedingService):
             "placeholder": "Query",
             "required": False,
         },
+        {
+            "id": "parallelism",
+            "type": "text",
+            "label": "Parallel requests",
+            "placeholder": "Number of requests sent at once (default 5)",
+            "required": False,
+        },
+        {
+            "id": "batch_size",
+            "type": "text",
+            "label": "Items per request",
+            "placeholder": "Number of items fetched using single request (default 10)",
+            "required": False,
+        },
     ]
 
     session = None
 
     def _update(self, provider, update):
-        items = []
+        """Fetch items page by page.
+
+        Items of every search page are yielded as soon as they are parsed.
+        Once page is ingested, cursor of next page is saved in provider,
+        so if update is interrupted, next one continues from that page.
+
+        Versions of ingested items are kept in provider too, details
+        of items found again are only fetched if there is a new version.
+        """
         self.provider = provider
         self.session = requests.Session()
         parser = self.get_feed_parser(provider)
         provider_config = self.provider.get("config")
-
-        if not provider_config.get("token") or self.is_token_expired(provider_config):
-            self.auth(provider, provider_config)
-
-        headers = {
-            "Authorization": f'Bearer {provider_config.get("token")}',
-            "Content-Type": "application/json",
-        }
-
-        cursor = ""
-        default_last_updated = datetime.datetime.utcnow() - datetime.timedelta(hours=1)
+        provider_config.setdefault("url", self.DEFAULT_URL)
+        provider_config.setdefault("auth_url", self.DEFAULT_AUTH_URL)
+
+        search = (provider.get("private") or {}).get("search") or {}
+        cursor = search.get("cursor", "")
+        date_range = search.get("date_range")
+        if not date_range:
+            default_last_updated = datetime.datetime.utcnow() - datetime.timedelta(hours=1)
+            date_range = provider.get("last_updated", default_last_updated).strftime("%Y.%m.%d.%H.%M.%S")
+        seen = self._get_seen(provider)
         data = {}
         while True:
+            items = []
+            ids = []
             try:
                 variables = {
                     "cursor": cursor,
-                    "dateRange": provider.get(
-                        "last_updated", default_last_updated
-                    ).strftime("%Y.%m.%d.%H.%M.%S"),
+                    "dateRange": date_range,
                 }
                 if provider_config.get("query", ""):
                     variables["query"] = provider_config["query"]
@@ -113,38 +152,25 @@ class NTBReutersHTTPFeedingService(HTTPFeedingService):
                 if provider_config.get("channel", ""):
                     variables["channel"] = provider_config["channel"]
 
-                response = self.session.post(
-                    provider_config.get("url"),
-                    headers=headers,
-                    data=json.dumps(
-                        {
-                            "query": self.get_query(provider_config),
-                            "variables": variables,
-                        }
-                    ),
-                    timeout=30,
+                data = self._post(
+                    provider_config,
+                    {
+                        "query": self.get_query(provider_config),
+                        "variables": variables,
+                    },
                 )
-                response.raise_for_status()
-                data = response.json()
-
-                for id in self.get_items_id(data):
-                    detailed_query = self.get_detailed_query(id)
-                    response = self.session.post(
-                        provider_config.get("url"),
-                        headers=headers,
-                        data=json.dumps({"query": detailed_query}),
-                        timeout=30,
-                    )
-                    response.raise_for_status()
-                    detailed_data = response.json()
+
+                ids = [id for id in self.get_items_id(data) if not self._is_seen(seen, id)]
+                for detailed_data in self._fetch_details(provider_config, ids):
                     items.append(parser.parse(detailed_data, provider))
 
             except requests.exceptions.HTTPError as e:
-                if e.response.status_code == 401:
-                    self.auth(provider, provider_config)
-                else:
-                    logger.error(e)
-                    return
+                logger.error(e)
+                return
+
+            if items:
+                failed = yield items
+                self._add_seen(seen, ids, failed)
 
             val = data.get("data", {}).get("search", {})
             if val:
@@ -152,62 +178,154 @@ class NTBReutersHTTPFeedingService(HTTPFeedingService):
                 cursor = page_info.get("endCursor")
                 if not page_info.get("hasNextPage"):
                     break
+                self._save_checkpoint(provider, {"cursor": cursor, "date_range": date_range}, seen)
             else:
                 break
 
-        if isinstance(items, list):
-            yield items
-        else:
-            yield [items]
+        # all pages were ingested, next update starts from last updated time
+        update["private"] = self._get_private(provider, {}, seen)
 
-    def auth(self, provider, provider_config):
-        provider_config.setdefault(
-            "url", "https://api.reutersconnect.com/content/graphql"
+    def _save_checkpoint(self, provider, search, seen):
+        """Save position of next search page and seen items in provider."""
+        private = self._get_private(provider, search, seen)
+        superdesk.get_resource_service("ingest_providers").system_update(
+            provider.get("_id"), {"private": private}, provider
         )
-        provider_config.setdefault(
-            "auth_url", "https://auth.thomsonreuters.com/oauth/token"
-        )
-
-        # get_Token...
-        auth_url = provider_config.get("auth_url", None)
-        body = {
-            "client_id": provider_config.get("client_id", ""),
-            "client_secret": provider_config.get("client_secret", ""),
-            "grant_type": "client_credentials",
-            "audience": provider_config.get("audience", ""),
+        provider["private"] = private
+
+    def _get_private(self, provider, search, seen):
+        recent = heapq.nlargest(self.MAX_SEEN, seen.values(), key=lambda entry: entry["seen_at"])
+        return dict(provider.get("private") or {}, search=search, seen=recent)
+
+    def _get_seen(self, provider):
+        """Get items ingested before by uri, items seen more than ``SEEN_TTL`` ago are dropped."""
+        min_seen_at = int(time.time() - self.SEEN_TTL.total_seconds())
+        return {
+            entry["uri"]: entry
+            for entry in (provider.get("private") or {}).get("seen") or []
+            if entry["seen_at"] >= min_seen_at
         }
-        response = self.session.post(auth_url, data=body, timeout=30)
-        response.raise_for_status()
-        if response.status_code == 200:
-            data = response.json()
-            if "token" in provider_config:
-                provider_config["token"] = data.get("access_token")
-            else:
-                provider_config.setdefault("token", data.get("access_token"))
-            if "expires_at" in provider_config:
-                provider_config["expires_at"] = int(
-                    datetime.datetime.now().timestamp()
-                ) + int(data.get("expires_in"))
-            else:
-                provider_config.setdefault(
-                    "expires_at",
-                    int(datetime.datetime.now().timestamp())
-                    + int(data.get("expires_in")),
-                )
-            superdesk.get_resource_service("ingest_providers").update(
-                provider.get("_id"), provider_config, provider
-            )
-        else:
-            raise IngestApiError.apiAuthError()
 
-    def is_token_expired(self, provider_config):
+    def _is_seen(self, seen, id):
+        """Test if same version of item was ingested before."""
+        return bool(id.get("version")) and seen.get(id["id"], {}).get("version") == id["version"]
+
+    def _add_seen(self, seen, ids, failed=None):
+        """Add ingested items to seen, items which failed to ingest are fetched again next time."""
+        seen_at = int(time.time())
+        for id in ids:
+            if id["id"] not in (failed or ()):
+                seen[id["id"]] = {"uri": id["id"], "version": id.get("version"), "seen_at": seen_at}
+
+    def _fetch_details(self, provider_config, ids):
+        """Fetch detailed data of items.
+
+        Up to ``batch_size`` items are fetched using single request,
+        up to ``parallelism`` requests are sent at once.
+        Data of every item are returned as if it was queried alone,
+        in the same order as ids. Only requests are done in parallel,
+        items are parsed by the caller.
         """
-        Check whether the token has expired.
+        if not ids:
+            return []
+        url = provider_config.get("url")
+        batch_size = self.get_batch_size(provider_config)
+        batches = [ids[start:start + batch_size] for start in range(0, len(ids), batch_size)]
+
+        def fetch(batch):
+            query, variables = self.get_detailed_query(batch)
+            return self._post(provider_config, {"query": query, "variables": variables})
+
+        parallelism = min(self.get_parallelism(provider_config), len(batches))
+        if parallelism == 1:
+            responses = [fetch(batch) for batch in batches]
+        else:
+            # keep a connection for every thread
+            self.session.mount(url, HTTPAdapter(pool_maxsize=parallelism))
+            # tokens are shared using app cache, get one before starting threads
+            # so those don't race creating the cache backend and fetching tokens
+            self.get_token(provider_config)
+            app_context = app._get_current_object().app_context
+
+            def fetch_in_app_context(batch):
+                with app_context():
+                    return fetch(batch)
+
+            with ThreadPoolExecutor(max_workers=parallelism) as executor:
+                responses = list(executor.map(fetch_in_app_context, batches))
+
+        return [
+            {"data": {"item": (response.get("data") or {}).get(self._alias(index))}}
+            for batch, response in zip(batches, responses)
+            for index in range(len(batch))
+        ]
+
+    def _post(self, provider_config, payload):
+        """Send GraphQL request, return response data.
+
+        Requests which failed with 429 or 5xx status are retried
+        with exponential backoff, or after time set by ``Retry-After`` header.
+        Request rejected with 401 status is sent once again with new token.
+
+        :raises requests.exceptions.HTTPError: when request failed even after retries
         """
-        current_time = datetime.datetime.now(datetime.timezone.utc).timestamp()
-        expires_at = provider_config.get("expires_at", datetime.datetime.min)
-
-        return current_time >= expires_at
+        body = json.dumps(payload)
+        retry = 0
+        reauthorized = False
+        while True:
+            token = self.get_token(provider_config)
+            response = self.session.post(
+                provider_config.get("url"),
+                headers={"Authorization": f"Bearer {token}", "Content-Type": "application/json"},
+                data=body,
+                timeout=self.HTTP_TIMEOUT,
+            )
+            if response.status_code == 401 and not reauthorized:
+                oauth.invalidate(*self._get_token_key(provider_config), token)
+                reauthorized = True
+                continue
+            if response.status_code not in self.RETRY_STATUSES or retry == self.MAX_RETRIES:
+                break
+            delay = self.get_retry_delay(response, retry)
+            logger.warning(
+                "Reuters API request failed with status %d, retrying in %.1fs",
+                response.status_code,
+                delay,
+            )
+            time.sleep(delay)
+            retry += 1
+        response.raise_for_status()
+        return response.json()
+
+    def get_retry_delay(self, response, retry):
+        try:
+            return float(response.headers["Retry-After"])
+        except (KeyError, ValueError):
+            return self.RETRY_BACKOFF * 2 ** retry
+
+    def get_parallelism(self, provider_config):
+        return self._get_positive_int(provider_config, "parallelism", self.DEFAULT_PARALLELISM)
+
+    def get_batch_size(self, provider_config):
+        return self._get_positive_int(provider_config, "batch_size", self.DEFAULT_BATCH_SIZE)
+
+    def _get_positive_int(self, provider_config, key, default):
+        try:
+            return max(1, int(provider_config.get(key) or default))
+        except ValueError:
+            return default
+
+    def get_token(self, provider_config):
+        """Get OAuth token shared by all providers using the same credentials."""
+        auth_url, client_id, audience = self._get_token_key(provider_config)
+        return oauth.get_token(auth_url, client_id, provider_config.get("client_secret", ""), audience)
+
+    def _get_token_key(self, provider_config):
+        return (
+            provider_config.get("auth_url") or self.DEFAULT_AUTH_URL,
+            provider_config.get("client_id", ""),
+            provider_config.get("audience", ""),
+        )
 
     def get_query(self, provider_config):
         query_params = {
@@ -249,16 +367,24 @@ class NTBReutersHTTPFeedingService(HTTPFeedingService):
                 }}
                 items {{
                     uri
+                    versionCreated
                 }}
             }}
         }}
         """
         return query
 
-    def get_detailed_query(self, id):
-        return f"""
-        query MyQuery($id: ID = "{id.get("id")}") {{
-            item(id: $id) {{
+    def get_detailed_query(self, ids):
+        """Get query for detailed data of multiple items.
+
+        Every item is queried using its own alias, ``i0`` for first item etc.
+
+        :return: query and its variables
+        """
+        params = ", ".join(f"${self._alias(index)}: ID!" for index in range(len(ids)))
+        items = "".join(
+            f"""
+            {self._alias(index)}: item(id: ${self._alias(index)}) {{
                 uri
                 type
                 versionCreated
@@ -273,15 +399,24 @@ class NTBReutersHTTPFeedingService(HTTPFeedingService):
                 name
                 code
                 }}
-            }}
+            }}"""
+            for index in range(len(ids))
+        )
+        query = f"""
+        query MyQuery({params}) {{{items}
         }}
         """
+        variables = {self._alias(index): id.get("id") for index, id in enumerate(ids)}
+        return query, variables
+
+    def _alias(self, index):
+        return f"i{index}"
 
     def get_items_id(self, content):
         item_ids = []
         data = content.get("data", {}).get("search", {}).get("items", [])
         for item in data:
-            item_ids.append({"id": item.get("uri", "")})
+            item_ids.append({"id": item.get("uri", ""), "version": item.get("versionCreated")})
 
         return item_ids
 
@@ -0,0 +1,148 @@
+"""OAuth tokens shared by HTTP feeding services.
+
+Tokens are fetched using client credentials grant and kept in process
+and in superdesk cache (redis when ``CACHE_URL`` is set), so all providers
+using the same credentials share single token, also across workers.
+
+Token is refreshed some time before it expires. Only one worker refreshes it,
+others keep using the current token meanwhile, or wait for the new one
+if there is no valid token.
+"""
+
+import time
+import logging
+import requests
+
+from typing import Dict, NamedTuple, Optional, Tuple
+from superdesk.cache import cache
+from superdesk.errors import IngestApiError
+
+logger = logging.getLogger(__name__)
+
+REFRESH_BEFORE = 300  # seconds before token expires
+HTTP_TIMEOUT = 30
+
+TokenKey = Tuple[str, str, str]
+
+
+class Token(NamedTuple):
+    access_token: str
+    expires_at: float
+    refresh_at: float
+
+    def is_valid(self, now: float) -> bool:
+        return now < self.expires_at
+
+    def is_fresh(self, now: float) -> bool:
+        return now < self.refresh_at
+
+
+class TokenManager:
+    """Tokens by ``(auth_url, client_id, audience)``."""
+
+    def __init__(self):
+        self._tokens: Dict[TokenKey, Token] = {}
+
+    def get_token(self, auth_url: str, client_id: str, client_secret: str, audience: str) -> str:
+        """Get access token, fetch new one if there is none or it should be refreshed.
+
+        :raises IngestApiError: if token can't be fetched
+        """
+        key = (auth_url, client_id, audience)
+        token = self._tokens.get(key)
+        if token is None or not token.is_fresh(time.time()):
+            token = self._refresh(key, client_secret, token)
+        return token.access_token
+
+    def invalidate(self, auth_url: str, client_id: str, audience: str, access_token: str) -> None:
+        """Drop token rejected by API, unless it was refreshed already."""
+        key = (auth_url, client_id, audience)
+        token = self._tokens.get(key)
+        if token is not None and token.access_token == access_token:
+            self._tokens.pop(key, None)
+        shared = self._load(key)
+        if shared is not None and shared.access_token == access_token:
+            cache.backend.remove(self._get_cache_key(key))
+
+    def clear(self) -> None:
+        self._tokens.clear()
+
+    def _refresh(self, key: TokenKey, client_secret: str, token: Optional[Token]) -> Token:
+        now = time.time()
+        shared = self._load(key)
+        if shared is not None and shared.is_fresh(now):
+            self._tokens[key] = shared
+            return shared
+
+        current = next((t for t in (token, shared) if t is not None and t.is_valid(now)), None)
+        lock = cache.backend.lock(self._get_cache_key(key))
+        if current is not None:
+            if not lock.acquire(wait=False):
+                # other worker is refreshing the token
+                return current
+        else:
+            lock.acquire()
+        try:
+            # it might be refreshed while waiting for lock
+            shared = self._load(key)
+            if shared is None or not shared.is_fresh(time.time()):
+                shared = self._fetch(key, client_secret)
+                cache.backend.save(
+                    {self._get_cache_key(key): shared._asdict()},
+                    ttl=max(1, int(shared.expires_at - time.time())),
+                )
+        finally:
+            lock.release()
+        self._tokens[key] = shared
+        return shared
+
+    def _fetch(self, key: TokenKey, client_secret: str) -> Token:
+        auth_url, client_id, audience = key
+        logger.info("Fetching OAuth token from %s for %s", auth_url, client_id)
+        response = requests.post(
+            auth_url,
+            data={
+                "client_id": client_id,
+                "client_secret": client_secret,
+                "grant_type": "client_credentials",
+                "audience": audience,
+            },
+            timeout=HTTP_TIMEOUT,
+        )
+        try:
+            response.raise_for_status()
+        except requests.exceptions.HTTPError as ex:
+            raise IngestApiError.apiAuthError(ex)
+        if response.status_code != 200:
+            raise IngestApiError.apiAuthError()
+        data = response.json()
+        expires_in = int(data.get("expires_in"))
+        now = time.time()
+        return Token(
+            access_token=data.get("access_token"),
+            expires_at=now + expires_in,
+            # short lived tokens are refreshed in the middle of their lifetime
+            refresh_at=now + expires_in - min(REFRESH_BEFORE, expires_in / 2),
+        )
+
+    def _load(self, key: TokenKey) -> Optional[Token]:
+        value = cache.backend.load(self._get_cache_key(key))
+        return Token(**value) if value else None
+
+    def _get_cache_key(self, key: TokenKey) -> str:
+        return "oauth_token:{}".format(":".join(key))
+
+
+tokens = TokenManager()
+
+
+def get_token(auth_url: str, client_id: str, client_secret: str, audience: str) -> str:
+    return tokens.get_token(auth_url, client_id, client_secret, audience)
+
+
+def invalidate(auth_url: str, client_id: str, audience: str, access_token: str) -> None:
+    tokens.invalidate(auth_url, client_id, audience, access_token)
+
+
+def clear() -> None:
+    tokens.clear()
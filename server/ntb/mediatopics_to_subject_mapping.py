@@ -1,38 +1,73 @@
 import ntb
 
+from typing import Dict, Optional, Tuple
 from flask import current_app as app
-from superdesk import get_resource_service
 from superdesk.timer import timer
 from superdesk.signals import item_publish
+from ntb import vocabularies
 from ntb.mediatopics import get_mediatopics
 
 MAPPING_CONFIG_KEY = "MEDIATOPIC_SUBJECTCODE_MAPPING"
 
 
+class TopicsMappingIndex:
+    """MediaTopic qcode -> subject code index.
+
+    It is built from the topics and subject codes vocabularies snapshots
+    and is only rebuilt when any of those or the mapping config changes.
+    """
+
+    def __init__(self):
+        self.version: Optional[Tuple] = None
+        self.mapping: Dict[str, Dict] = {}
+
+    def get(self) -> Dict[str, Dict]:
+        version = self._get_version()
+        if version != self.version:
+            self.mapping = _get_topics_mapping()
+            self.version = version
+        return self.mapping
+
+    def clear(self) -> None:
+        self.version = None
+        self.mapping = {}
+
+    def _get_version(self) -> Tuple:
+        # snapshots are replaced when vocabulary changes,
+        # so comparing them by identity is enough
+        return (
+            vocabularies.get_vocabulary(ntb.MEDIATOPICS_CV),
+            vocabularies.get_vocabulary(ntb.SUBJECTCODES_CV),
+            tuple(sorted(app.config[MAPPING_CONFIG_KEY].items())),
+        )
+
+
+topics_mapping = TopicsMappingIndex()
+
+
 def populate_subject(sender, item, **kwargs) -> None:
     topics = get_mediatopics(item)
     if not topics:
         return
     with timer("mediatopics:mapping"):
-        mapping = _get_topics_mapping()
-    subjects = []
+        mapping = topics_mapping.get()
+
+    existing = {(s["qcode"], s.get("scheme")) for s in item["subject"]}
     for topic in topics:
         subject = mapping.get(topic["qcode"])
-        if subject:
-            subjects.append(subject)
-
-    for subject in subjects:
-        if not any(
-            s["qcode"] == subject["qcode"] and s.get("scheme") == subject.get("scheme")
-            for s in item["subject"]
-        ):
-            item["subject"].append(subject)
+        if not subject:
+            continue
+        key = (subject["qcode"], subject.get("scheme"))
+        if key not in existing:
+            existing.add(key)
+            # index is shared between items so append a copy
+            item["subject"].append(dict(subject))
 
 
 def _get_topics_mapping():
     _topics_mapping = {}
-    topics = get_resource_service("vocabularies").get_items(ntb.MEDIATOPICS_CV)
-    subjects = get_resource_service("vocabularies").get_items(ntb.SUBJECTCODES_CV)
+    topics = vocabularies.get_items(ntb.MEDIATOPICS_CV)
+    subjects_by_qcode = vocabularies.get_items_by_qcode(ntb.SUBJECTCODES_CV)
     for topic in topics:
         subject_code = app.config[MAPPING_CONFIG_KEY].get(topic["qcode"])
         if not subject_code and topic["qcode"] in app.config[MAPPING_CONFIG_KEY]:
@@ -41,10 +76,9 @@ def _get_topics_mapping():
             subject_code = topic["iptc_subject"]
         if not subject_code:
             continue
-        for subject in subjects:
-            if subject.get("qcode") == subject_code:
-                _topics_mapping[topic["qcode"]] = subject
-                break
+        subject = subjects_by_qcode.get(subject_code)
+        if subject is not None:
+            _topics_mapping[topic["qcode"]] = subject
     return _topics_mapping
 
 
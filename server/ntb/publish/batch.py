@@ -0,0 +1,89 @@
+"""Formatting of multiple articles for a subscriber at once."""
+
+import abc
+import itertools
+
+from typing import Dict, Iterable, Iterator, List
+from flask import current_app as app
+from superdesk import get_resource_service
+
+
+def generate_sequence_numbers(subscriber) -> Iterator[int]:
+    """Generate subscriber sequence numbers one by one, when needed."""
+    service = get_resource_service("subscribers")
+    while True:
+        yield service.generate_sequence_number(subscriber)
+
+
+def reserve_sequence_numbers(subscriber, count) -> List[int]:
+    """Reserve ``count`` subscriber sequence numbers using single update.
+
+    Numbers are same as would be returned by calling
+    ``SubscribersService.generate_sequence_number`` ``count`` times,
+    including restart from min value when max value is exceeded.
+    """
+    if count < 1:
+        return []
+    min_seq_number = 1
+    max_seq_number = app.config["MAX_VALUE_OF_PUBLISH_SEQUENCE"]
+    if subscriber.get("sequence_num_settings"):
+        min_seq_number = subscriber["sequence_num_settings"]["min"]
+        max_seq_number = subscriber["sequence_num_settings"]["max"]
+
+    # must be same key as used by core
+    key_name = "subscribers_{_id})".format(_id=subscriber["_id"])
+    sequences = get_resource_service("sequences")
+    last = sequences.find_and_modify(
+        query={"key": key_name},
+        update={"$inc": {"sequence_number": count}},
+        upsert=True,
+        new=True,
+    ).get("sequence_number")
+    numbers = list(range(last - count + 1, last + 1))
+
+    if max_seq_number and last > max_seq_number:
+        size = max_seq_number - min_seq_number + 1
+        numbers = [
+            n if n <= max_seq_number else min_seq_number + (n - max_seq_number - 1) % size
+            for n in numbers
+        ]
+        sequences.find_and_modify(
+            query={"key": key_name},
+            update={"$set": {"sequence_number": numbers[-1]}},
+        )
+
+    return numbers
+
+
+class BatchFormatterMixin(abc.ABC):
+    """Add ``format_many`` to formatter.
+
+    Formatter must implement ``_format`` taking sequence numbers iterator
+    and ``_count_sequence_numbers`` returning how many numbers article needs.
+    """
+
+    def format_many(
+        self, articles: Iterable[Dict], subscriber, codes=None
+    ) -> Iterator[List]:
+        """Format articles for subscriber.
+
+        Sequence numbers for all articles are reserved at once,
+        output of every article (same as ``format`` returns) is yielded
+        when formatted.
+        """
+        articles = list(articles)
+        count = sum(self._count_sequence_numbers(article) for article in articles)
+        sequence_numbers = itertools.chain(
+            reserve_sequence_numbers(subscriber, count),
+            # in case article needs more than expected
+            generate_sequence_numbers(subscriber),
+        )
+        for article in articles:
+            yield self._format(article, subscriber, sequence_numbers, codes)
+
+    @abc.abstractmethod
+    def _format(self, article, subscriber, sequence_numbers, codes=None) -> List:
+        ...
+
+    def _count_sequence_numbers(self, article) -> int:
+        return 1
@@ -0,0 +1,142 @@
+"""Article body parsing shared by NTB formatters."""
+
+import regex
+import threading
+
+from typing import NamedTuple
+from lxml import etree
+from lxml.html import HTMLParser
+from superdesk.etree import BLOCK_ELEMENTS, clean_html, to_string
+
+from . import utils
+
+# same as used by superdesk.text_utils.get_text_word_count
+NUMBER_SPACE_RE = regex.compile(r"([0-9]) ([0-9])", regex.MULTILINE | regex.UNICODE)
+NOT_WORD_RE = regex.compile(r"[^\p{L} 0-9]", regex.MULTILINE | regex.UNICODE)
+SPACES_RE = regex.compile(r" {2,}", regex.MULTILINE | regex.UNICODE)
+
+
+class BodyAnalysis(NamedTuple):
+    html: str
+    char_count: int
+    word_count: int
+
+
+class BodyPipeline:
+    """Parse article body once, using parsers reused in current thread.
+
+    lxml parsers can't be shared between threads, so every thread
+    creates its own on first use.
+    """
+
+    def __init__(self):
+        self._local = threading.local()
+
+    @property
+    def xml_parser(self) -> etree.XMLParser:
+        try:
+            return self._local.xml_parser
+        except AttributeError:
+            # we use XMLParser instead of HTMLParser for NITF because HTMLParser
+            # will not remove all whitespace resulting in trouble when pretty printing
+            # (cf. http://lxml.de/FAQ.html#why-doesn-t-the-pretty-print-option-reformat-my-xml-output)
+            self._local.xml_parser = etree.XMLParser(recover=True, remove_blank_text=True)
+            return self._local.xml_parser
+
+    @property
+    def html_parser(self) -> HTMLParser:
+        try:
+            return self._local.html_parser
+        except AttributeError:
+            self._local.html_parser = HTMLParser(recover=True, remove_blank_text=True)
+            return self._local.html_parser
+
+    def parse_xml(self, article):
+        """Parse article body as XML.
+
+        :return: ``<div>`` element with body content and media data
+        """
+        html, media_data = utils.format_body_content(article)
+        try:
+            root = etree.fromstring("".join(("<div>", html, "</div>")), self.xml_parser)
+        except Exception as e:
+            raise ValueError("Can't parse body_html content: {}".format(e))
+        return root, media_data
+
+    def parse_html(self, article):
+        """Parse article body as HTML.
+
+        :return: ``<html>`` element with body content and media data
+        """
+        html, media_data = utils.format_body_content(article)
+        try:
+            root = etree.fromstring(html, self.html_parser)
+        except Exception as e:
+            raise ValueError("Can't parse body_html content: {}".format(e))
+        return root, media_data
+
+    def analyse_html(self, article) -> BodyAnalysis:
+        """Get cleaned HTML of article body with its char and word count.
+
+        Body is only parsed once, counts are computed from the cleaned tree.
+        """
+        root, _ = self.parse_html(article)
+        root = clean_html(root)
+        html = to_string(root, method="html", remove_root_div=True)
+        return BodyAnalysis(html, *get_html_stats(root))
+
+
+def get_html_stats(root):
+    """Get char count without line feeds and word count of HTML element text content.
+
+    The cleaned tree is walked once instead of parsing serialised element again,
+    so counts might differ from ``superdesk.text_utils`` in corner cases
+    like whitespace between elements.
+
+    :return: char count and word count
+    """
+    char_count = 0
+    # text with line feeds after block elements and ``<br>``, used to count words
+    text = []
+    for event, elem in etree.iterwalk(root, events=("start", "end")):
+        if event == "start":
+            if elem.text and isinstance(elem.tag, str):
+                text.append(elem.text)
+                char_count += len(elem.text) - elem.text.count("\n")
+        elif elem is not root:
+            if elem.tag == "br":
+                text.append("\n")
+            if elem.tail:
+                text.append(elem.tail)
+                char_count += len(elem.tail) - elem.tail.count("\n")
+            if elem.tag in BLOCK_ELEMENTS:
+                text.append("\n")
+    return char_count, get_text_word_count("".join(text))
+
+
+def get_text_word_count(text) -> int:
+    """Count words of plain text.
+
+    Same as ``superdesk.text_utils.get_text_word_count``
+    without parsing the text as markup first.
+    """
+    text = text.strip()
+    if not text:
+        return 0
+    text = text.replace("\n", " ")
+    # 1 000 000 -> 1000000
+    text = NUMBER_SPACE_RE.sub("\\1\\2", text)
+    text = NOT_WORD_RE.sub("", text)
+    text = SPACES_RE.sub(" ", text)
+    return len(text.strip().split(" "))
+
+
+def get_char_count(elem) -> int:
+    """Count characters of element text content without line feeds.
+
+    It's the same as counting serialised text but avoids creating it.
+    """
+    return sum(len(text) - text.count("\n") for text in elem.itertext())
+
+
+pipeline = BodyPipeline()
@@ -1,15 +1,34 @@
+from datetime import datetime
+from typing import NamedTuple
 from lxml import etree
 
 from planning.common import POST_STATE, WORKFLOW_STATE
 from superdesk.publish.formatters import Formatter
-from superdesk.utc import get_date, utc_to_local, utcnow
+from superdesk.utc import utcnow
 from superdesk import get_resource_service
 
+from ntb import contacts, timezones
+from ntb.cache import LRUCache
+from . import timings
+from .batch import BatchFormatterMixin
+
 
 DELETE_STATES = {WORKFLOW_STATE.CANCELLED, WORKFLOW_STATE.POSTPONED}
 
+#: NTB ids of events which were rescheduled, by event id
+#: fields used to compute the id don't change, so those can be kept
+rescheduled_ids = LRUCache(maxsize=10000)
+
+
+class LocalDates(NamedTuple):
+    """Event dates in event timezone, ``time`` is in formatter timezone."""
+
+    time: datetime
+    start: datetime
+    end: datetime
+
 
-class NTBEventFormatter(Formatter):
+class NTBEventFormatter(BatchFormatterMixin, Formatter):
 
     ENCODING = 'iso-8859-1'
     SERVICE = 'newscalendar'
@@ -22,15 +41,33 @@ class NTBEventFormatter(Formatter):
         return format_type == 'ntb_event' and article.get('type') == 'event'
 
     def format(self, item, subscriber, codes=None):
-        doc = etree.Element('document')
-        self._format_doc(doc, item)
-        xml = etree.tostring(doc, pretty_print=True, xml_declaration=True, encoding=self.ENCODING)
+        return self._format(item, subscriber, iter(()), codes)
+
+    def format_many(self, items, subscriber, codes=None):
+        items = list(items)
+        # fetch contacts of all events at once
+        contacts.preload(
+            contact_id for item in items for contact_id in item.get('event_contact_info') or []
+        )
+        return super().format_many(items, subscriber, codes)
+
+    def _format(self, item, subscriber, sequence_numbers, codes=None):
+        with timings.item(self.type, item.get('_id')):
+            doc = etree.Element('document')
+            with timings.stage(timings.METADATA):
+                self._format_doc(doc, item)
+            with timings.stage(timings.SERIALISE):
+                xml = etree.tostring(doc, pretty_print=True, xml_declaration=True, encoding=self.ENCODING)
         return [{
             'published_seq_num': None,
             'formatted_item': xml.decode(self.ENCODING),
             'encoded_item': xml,
         }]
 
+    def _count_sequence_numbers(self, item):
+        # events are sent without sequence number
+        return 0
+
     def _format_doc(self, doc, item):
         ntb_id = etree.SubElement(doc, 'ntbId')
         ntb_id.text = self._format_id(item)
@@ -46,13 +83,13 @@ class NTBEventFormatter(Formatter):
         published.text = 'True'
         title = etree.SubElement(doc, 'title')
         title.text = item.get('name')
+        dates = self._get_local_dates(item)
         time = etree.SubElement(doc, 'time')
-        time.text = self._format_time(item.get('versioncreated'))
-        dates = item.get('dates', {})
+        time.text = self._format_time(dates.time)
         time_start = etree.SubElement(doc, 'timeStart')
-        time_start.text = self._format_time(dates.get('start'), dates.get('tz'))
+        time_start.text = self._format_time(dates.start)
         time_end = etree.SubElement(doc, 'timeEnd')
-        time_end.text = self._format_time(dates.get('end'), dates.get('tz'))
+        time_end.text = self._format_time(dates.end)
         self._format_alldayevent(doc, dates)
         priority = etree.SubElement(doc, 'priority')
         priority.text = str(item.get('priority', self.PRIORITY))
@@ -102,8 +139,7 @@ class NTBEventFormatter(Formatter):
                 latitude.text = str(item_geo.get('lat', ''))
                 longitude.text = str(item_geo.get('lon', ''))
 
-    def _format_time(self, time, tz=None):
-        local_time = self._get_local_time(time, tz if tz else self.TIMEZONE)
+    def _format_time(self, local_time):
         return local_time.strftime('%Y-%m-%dT%H:%M:%S')
 
     def _format_id(self, item):
@@ -112,30 +148,45 @@ class NTBEventFormatter(Formatter):
 
         time = item.get('firstcreated')
         if item.get('reschedule_from'):
-            parent_event = get_resource_service('events').find_one(
-                req=None,
-                _id=item.get('reschedule_from')
-            )
-            if parent_event:
-                return self._format_id(parent_event)
+            parent_id = self._format_parent_id(item['reschedule_from'])
+            if parent_id:
+                return parent_id
         elif item.get('duplicate_from'):
             time = item.get('_created')
 
         local_time = self._get_local_time(time)
         return 'NBRP{}_hh_00'.format(local_time.strftime('%y%m%d_%H%M%S'))
 
+    def _format_parent_id(self, parent_id):
+        """
+        Get NTB id of the event which was rescheduled, ``None`` if it doesn't exist.
+
+        Ids are remembered for every event in the reschedule chain, so once the chain
+        was resolved it's not walked again, no matter how many times it was rescheduled.
+
+        :param parent_id: Id of rescheduled event
+        """
+        key = str(parent_id)
+        ntb_id = rescheduled_ids.get(key)
+        if ntb_id is None:
+            with timings.stage(timings.DB):
+                parent_event = get_resource_service('events').find_one(req=None, _id=parent_id)
+            if not parent_event:
+                return None
+            ntb_id = self._format_id(parent_event)
+            rescheduled_ids.set(key, ntb_id)
+        return ntb_id
+
     def _format_alldayevent(self, doc, dates):
         """
         Checks if the event is all day or not and sets `alldayevent` tag.
 
         :param etree.Element doc: The xml document for publishing
-        :param dict dates: Event dates
+        :param LocalDates dates: Event dates
         """
-        local_start_time = self._get_local_time(dates.get('start'), dates.get('tz'))
-        local_end_time = self._get_local_time(dates.get('end'), dates.get('tz'))
         _pattern = '%H:%M'
-        is_all_day_event = (local_start_time.strftime(_pattern) == '00:00' and
-                            local_end_time.strftime(_pattern) == '23:59')
+        is_all_day_event = (dates.start.strftime(_pattern) == '00:00' and
+                            dates.end.strftime(_pattern) == '23:59')
         alldayevent = etree.SubElement(doc, 'alldayevent')
         alldayevent.text = str(is_all_day_event)
 
@@ -155,7 +206,21 @@ class NTBEventFormatter(Formatter):
             time = utcnow()
         if not tz:
             tz = self.TIMEZONE
-        return utc_to_local(tz, get_date(time))
+        return timezones.to_local(time, tz)
+
+    def _get_local_dates(self, item):
+        """
+        Converts all event dates at once.
+
+        :param dict item: Event item
+        :rtype: LocalDates
+        """
+        dates = item.get('dates', {})
+        return LocalDates(
+            time=self._get_local_time(item.get('versioncreated')),
+            start=self._get_local_time(dates.get('start'), dates.get('tz')),
+            end=self._get_local_time(dates.get('end'), dates.get('tz')),
+        )
 
     def _format_contact_info(self, doc, item):
         """
@@ -166,11 +231,8 @@ class NTBEventFormatter(Formatter):
         """
         if len(item.get('event_contact_info', [])) > 0:
             # find first public contact
-            contact_details = get_resource_service('contacts').find_one(
-                req=None,
-                _id={'$in': item['event_contact_info']},
-                public=True
-            )
+            with timings.stage(timings.DB):
+                contact_details = contacts.get_first_public(item['event_contact_info'])
 
             if contact_details:
                 firstName = contact_details.get('first_name', '')
@@ -1,14 +1,73 @@
-import lxml.etree as etree
+import json
 
-from flask import g
-from typing import Dict, List
-from lxml.html import HTMLParser
+from functools import partial
+from types import MappingProxyType
+from typing import Any, Dict, Iterator, List, Mapping, Optional, Tuple
+from eve.utils import config
+from apps.archive.common import get_utc_schedule
 from superdesk import get_resource_service
-from superdesk.etree import clean_html, to_string
+from superdesk.errors import FormatterError
+from superdesk.metadata.item import ASSOCIATIONS, CONTENT_TYPE, EMBARGO, GUID_FIELD, ITEM_TYPE
 from superdesk.publish.formatters.ninjs_formatter import NINJSFormatter
-from superdesk.text_utils import get_char_count, get_word_count
-
-from . import utils
+from superdesk.text_utils import get_text
+from superdesk.utils import json_serialize_datetime_objectId
+from superdesk.vocabularies import is_related_content
+
+from ntb import vocabularies
+from . import body, planning_ids, timings, utils
+from .batch import BatchFormatterMixin, generate_sequence_numbers
+
+
+RIGHTS_FIELDS = ("copyrightholder", "copyrightnotice", "usageterms")
+
+#: NINJS v2 properties and formatter methods computing them,
+#: properties without method are copied from article.
+#: Only those properties are computed and ``None`` values are left out,
+#: ``associations`` are added to top level item only.
+NINJS_V2_PROPERTIES: Mapping[str, Optional[str]] = MappingProxyType(
+    {
+        "headlines": "_format_v2_headlines",
+        "uri": "_format_uri",
+        "type": "_get_type",
+        "profile": "_format_v2_profile",
+        "version": "_format_version",
+        "firstcreated": None,
+        "versioncreated": None,
+        "pubstatus": None,
+        "embargoed": "_format_embargoed",
+        "urgency": None,
+        "copyrightholder": "_format_copyrightholder",
+        "copyrightnotice": "_format_copyrightnotice",
+        "usageterms": "_format_usageterms",
+        "ednote": None,
+        "language": None,
+        "descriptions": "_format_v2_descriptions",
+        "bodies": "_format_v2_bodies",
+        "people": "_format_people",
+        "organisations": "_format_organisations",
+        "places": "_format_places",
+        "subjects": "_format_v2_subjects",
+        "events": "_format_events",
+        "objects": "_format_objects",
+        "by": "_format_by",
+        "slugline": None,
+        "located": "_format_located",
+        "altids": "_format_altids",
+        "genre": "_format_v2_genre",
+        "service": "_format_v2_service",
+        "taglines": "_format_taglines",
+        "infosources": "_format_infosources",
+        "NTBKilde": "_format_ntb_kilde",
+    }
+)
+
+
+#: same as ``json.dumps`` with ``default`` used by core NINJS formatter
+json_encoder = json.JSONEncoder(default=json_serialize_datetime_objectId)
+
+
+def _copy_property(name, article):
+    return article.get(name)
 
 
 def format_array_value(assoc, name):
@@ -28,7 +87,7 @@ def convert_dicts_to_lists(ninjs):
             ninjs.pop(field)
 
 
-class NTBNINJSFormatter(NINJSFormatter):
+class NTBNINJSFormatter(BatchFormatterMixin, NINJSFormatter):
     """NTB NINJS formatter
 
     .. versionadded:: 2.0
@@ -43,96 +102,224 @@ class NTBNINJSFormatter(NINJSFormatter):
     def __init__(self):
         super().__init__()
         self.format_type = "ntb_ninjs"
-        self._places = None
+        self._v2_getters = tuple(
+            (name, getattr(self, method) if method else partial(_copy_property, name))
+            for name, method in NINJS_V2_PROPERTIES.items()
+        )
+
+    def format(self, article, subscriber, codes=None):
+        return self._format(article, subscriber, generate_sequence_numbers(subscriber), codes)
+
+    def format_many(self, articles, subscriber, codes=None):
+        articles = list(articles)
+        # resolve planning ids for all coverages at once
+        planning_ids.resolver.resolve(
+            article["assignment_id"] for article in articles if article.get("assignment_id")
+        )
+        return super().format_many(articles, subscriber, codes)
+
+    def _format(self, article, subscriber, sequence_numbers, codes=None):
+        try:
+            with timings.item(self.type, article.get("_id")):
+                with timings.stage(timings.DB):
+                    pub_seq_num = next(sequence_numbers)
+                ninjs = self._transform_to_ninjs(article, subscriber)
+                # publish queue keeps whole item, so encode it at once using C encoder
+                with timings.stage(timings.SERIALISE):
+                    encoded = json.dumps(ninjs, default=json_serialize_datetime_objectId)
+                return [(pub_seq_num, encoded)]
+        except Exception as ex:
+            raise FormatterError.ninjsFormatterError(ex, subscriber)
+
+    def iter_encode(self, article, subscriber) -> Iterator[str]:
+        """Encode article as NINJS JSON in chunks.
+
+        Output is the same as ``json.dumps`` of ``_transform_to_ninjs`` result,
+        but every property and association is encoded as soon as it's computed,
+        so the NINJS item and its associations are never in memory at once.
+        It's slower than ``json.dumps``, so only use it when output is written
+        in chunks, ``format`` keeps whole item for publish queue anyway.
+        """
+        yield "{"
+        separator = ""
+        for name, value in self._iter_properties(article):
+            yield separator
+            yield json_encoder.encode(name)
+            yield ": "
+            yield from timings.iter_stage(timings.SERIALISE, json_encoder.iterencode(value))
+            separator = ", "
+
+        # empty associations are left out
+        has_associations = False
+        for key, item in self._iter_associations(article, subscriber):
+            yield ", " if has_associations else separator + '"associations": ['
+            yield from timings.iter_stage(timings.SERIALISE, json_encoder.iterencode(dict(item, name=key)))
+            has_associations = True
+        if has_associations:
+            yield "]"
+        yield "}"
 
     def _transform_to_ninjs(self, article, subscriber, recursive=True):
-        ninjs = super()._transform_to_ninjs(article, subscriber, recursive)
+        # single stage for all properties, nested stages are not included
+        with timings.stage(timings.METADATA):
+            ninjs = dict(self._iter_properties(article))
+
+        if recursive:
+            associations = self._format_associations(article, subscriber)
+            if associations is not None:
+                ninjs["associations"] = associations
+            # should only run at the end, so do this on top level item only
+            convert_dicts_to_lists(ninjs)
 
-        imatrics_fields = {
-            "people": "person",
-            "organisations": "organisation",
-            "events": "event",
-            "objects": "object",
+        return ninjs
+
+    def _iter_properties(self, article) -> Iterator[Tuple[str, Any]]:
+        for name, getter in self._v2_getters:
+            value = getter(article)
+            if value is not None:
+                yield name, value
+
+    def _format_associations(self, article, subscriber):
+        if article[ITEM_TYPE] == CONTENT_TYPE.COMPOSITE:
+            associations = self._get_associations(article, subscriber)
+            associations.update(self._iter_related(article, subscriber))
+            return associations
+        if article.get(ASSOCIATIONS):
+            return dict(self._iter_related(article, subscriber))
+        return None
+
+    def _iter_associations(self, article, subscriber) -> Iterator[Tuple[str, Dict]]:
+        if article[ITEM_TYPE] == CONTENT_TYPE.COMPOSITE:
+            # package groups might be overridden by associations, so keep it simple
+            yield from self._format_associations(article, subscriber).items()
+        else:
+            yield from self._iter_related(article, subscriber)
+
+    def _iter_related(self, article, subscriber) -> Iterator[Tuple[str, Dict]]:
+        """Format associated items one by one.
+
+        Same associations as ``NINJSFormatter._format_related`` returns,
+        without renditions and extra items which are not part of NINJS v2.
+        """
+        archive_service = get_resource_service("archive")
+        associations = sorted(
+            (article.get(ASSOCIATIONS) or {}).items(),
+            key=lambda itm: (itm[1] or {}).get("order", 1),
+        )
+        for key, item in associations:
+            if not item:
+                continue
+            if is_related_content(key) and "_type" not in item:
+                with timings.stage(timings.DB):
+                    orig_item = archive_service.find_one(req=None, _id=item["_id"])
+                orig_item["order"] = item.get("order", 1)
+                item = orig_item.copy()
+            yield key, self._transform_to_ninjs(item, subscriber, recursive=False)
+
+    def _format_uri(self, article):
+        return article.get(GUID_FIELD, article.get("uri")) or None
+
+    def _format_version(self, article):
+        return str(article.get(config.VERSION, 1))
+
+    def _format_v2_profile(self, article):
+        if article.get("profile"):
+            return self._format_profile(article["profile"])
+
+    def _format_embargoed(self, article):
+        embargoed = None
+        if article.get("embargoed"):
+            embargoed = article["embargoed"].isoformat()
+        if article.get(EMBARGO):  # embargo set in superdesk overrides ingested one
+            embargoed = get_utc_schedule(article, EMBARGO).isoformat()
+        return embargoed
+
+    def _format_copyrightnotice(self, article):
+        return self._get_rights(article, "copyrightnotice")
+
+    def _format_usageterms(self, article):
+        return self._get_rights(article, "usageterms")
+
+    def _get_rights(self, article, field):
+        if any(article.get(name) for name in RIGHTS_FIELDS):
+            return article.get(field)
+        rights = self._get_rightsinfo(article)
+        return rights[field] if field in rights else article.get(field)
+
+    def _get_rightsinfo(self, article):
+        """Same as ``VocabulariesService.get_rightsinfo`` but using snapshot."""
+        vocabulary = vocabularies.get_vocabulary("rightsinfo")
+        if vocabulary is None or not vocabulary.items:
+            return {}
+        items = get_resource_service("vocabularies").get_locale_vocabulary(
+            list(vocabulary.items), article.get("language")
+        )
+        rights_key = article.get("source", article.get("original_source", "default"))
+        rights = next((info for info in items if info["name"] == rights_key), None)
+        if rights is None:
+            rights = next((info for info in items if info["name"] == "default"), None)
+        if not rights:
+            return {}
+        return {
+            "copyrightholder": rights.get("copyrightHolder"),
+            "copyrightnotice": rights.get("copyrightNotice"),
+            "usageterms": rights.get("usageTerms"),
         }
-        for field, value in imatrics_fields.items():
-            ninjs[field] = self.format_imatrics(article, value)
 
-        if ninjs.get("headline"):
-            ninjs["headlines"] = self.format_headlines(article)
+    def _format_v2_headlines(self, article):
+        headline = article["title"] if "title" in article else article.get("headline")
+        if headline:
+            return self.format_headlines(article)
 
-        if ninjs.get("description_text"):
-            ninjs["descriptions"] = self.format_descriptions(ninjs)
+    def _format_v2_descriptions(self, article):
+        if article.get("abstract"):
+            description_text = get_text(article["abstract"])
+        else:
+            description_text = article.get("description_text")
+        if description_text:
+            return self.format_descriptions({"description_text": description_text})
 
+    def _format_v2_bodies(self, article):
         if article.get("body_html"):
             body_footer = article.get('body_footer', '').strip()
             if body_footer:
                 article['body_html'] += body_footer
-            ninjs["bodies"] = self.format_bodies(article)
-
-        if ninjs.get("subject"):
-            ninjs["subjects"] = self.format_subjects(ninjs)
-
-        if ninjs.get("place"):
-            ninjs["places"] = ninjs["place"]
-
-        if ninjs.get("guid"):
-            ninjs.setdefault("uri", ninjs["guid"])
-
-        if ninjs.get("extra", {}).get("ntb_pub_name"):
-            ninjs["NTBKilde"] = ninjs["extra"]["ntb_pub_name"]
-
-        # removed items which mapped according to Ninjs v2 properties
-        ninjs_properties = [
-            "headlines",
-            "uri",
-            "type",
-            "profile",
-            "version",
-            "firstcreated",
-            "versioncreated",
-            "pubstatus",
-            "contentcreated",
-            "embargoed",
-            "urgency",
-            "copyrightholder",
-            "copyrightnotice",
-            "usageterms",
-            "ednote",
-            "language",
-            "descriptions",
-            "bodies",
-            "headlines",
-            "people",
-            "organisations",
-            "places",
-            "subjects",
-            "events",
-            "objects",
-            "title",
-            "by",
-            "slugline",
-            "located",
-            "associations",
-            "altids",
-            "trustindicators",
-            "standard",
-            "genre",
-            "rightsinfo",
-            "service",
-            "infosources",
-            "NTBKilde",
-        ]
+            return self.format_bodies(article)
+
+    def _format_people(self, article):
+        return self.format_imatrics(article, "person")
+
+    def _format_organisations(self, article):
+        return self.format_imatrics(article, "organisation")
 
-        for key in list(ninjs.keys()):
-            if key not in ninjs_properties or ninjs[key] is None:
-                ninjs.pop(key)
+    def _format_events(self, article):
+        return self.format_imatrics(article, "event")
 
-        ninjs["altids"] = [
+    def _format_objects(self, article):
+        return self.format_imatrics(article, "object")
+
+    def _format_places(self, article):
+        if article.get("place"):
+            return self._format_place(article) or None
+
+    def _format_v2_subjects(self, article):
+        if article.get("subject"):
+            subject = self._get_subject(article)
+            if subject:
+                return self.format_subjects({"subject": subject})
+
+    def _format_located(self, article):
+        located = article.get("dateline", {}).get("located", {})
+        if located:
+            return located.get("city", "")
+
+    def _format_altids(self, article):
+        altids = [
             {"role": "GUID", "value": article["guid"]},
         ]
 
         if article.get("family_id"):
-            ninjs["altids"].extend(
+            altids.extend(
                 [
                     {"role": "NTB-ID", "value": utils.get_ntb_id(article)},
                     {"role": "DOC-ID", "value": utils.get_doc_id(article)},
@@ -140,27 +327,37 @@ class NTBNINJSFormatter(NINJSFormatter):
             )
 
         if article.get("assignment_id"):
-            self._format_planning_ids(ninjs, article)
+            self._format_planning_ids(altids, article)
+
+        return altids
+
+    def _format_v2_genre(self, article):
+        if article.get("genre"):
+            return self._get_genre(article)
+
+    def _format_v2_service(self, article):
+        if article.get("anpa_category"):
+            return self._get_service(article)
 
-        ninjs["taglines"] = []
+    def _format_taglines(self, article):
         if article.get("sign_off"):
-            for tagline in article["sign_off"].split("/"):
-                ninjs["taglines"].append(tagline.strip())
+            return [tagline.strip() for tagline in article["sign_off"].split("/")]
+        return []
 
+    def _format_infosources(self, article):
         if article.get("type") == "text":
-            ninjs["infosources"] = [
+            return [
                 {"name": utils.get_distributor(article)},
             ]
 
-        if article.get("byline"):
-            ninjs["by"] = article["byline"]
+    def _format_by(self, article):
+        return article.get("byline") or None
 
-        if recursive:  # should only run at the end, so do this on top level item only
-            convert_dicts_to_lists(ninjs)
-
-        ninjs["copyrightholder"] = "NTB"
+    def _format_copyrightholder(self, article):
+        return "NTB"
 
-        return ninjs
+    def _format_ntb_kilde(self, article):
+        return (article.get("extra") or {}).get("ntb_pub_name") or None
 
     def _format_place(self, article) -> List[Dict]:
         places = []
@@ -218,19 +415,13 @@ class NTBNINJSFormatter(NINJSFormatter):
         return [{"value": ninjs.get("description_text"), "contenttype": "text/plain"}]
 
     def format_bodies(self, article):
-        html, _ = utils.format_body_content(article)
-        parser = HTMLParser(recover=True, remove_blank_text=True)
-        try:
-            html_tree = etree.fromstring(html, parser)
-        except Exception as e:
-            raise ValueError("Can't parse body_html content: {}".format(e))
-        html_tree_clean = clean_html(html_tree)
-        html = to_string(html_tree_clean, method="html", remove_root_div=True)
+        with timings.stage(timings.BODY):
+            analysis = body.pipeline.analyse_html(article)
         return [
             {
-                "charcount": get_char_count(html),
-                "wordcount": get_word_count(html),
-                "value": html,
+                "charcount": analysis.char_count,
+                "wordcount": analysis.word_count,
+                "value": analysis.html,
                 "contenttype": "text/html",
             }
         ]
@@ -250,29 +441,22 @@ class NTBNINJSFormatter(NINJSFormatter):
 
     @property
     def places(self):
-        if getattr(g, "_places", None) is None:
-            places = get_resource_service("vocabularies").get_items("place_custom")
-            g._places = {p["qcode"]: p for p in places}
-        return getattr(g, "_places")
-
-    def _format_planning_ids(self, ninjs, article):
-        assignment = get_resource_service("assignments").find_one(
-            req=None, _id=article["assignment_id"]
-        )
-        if assignment and assignment.get("planning_item"):
-            ninjs.setdefault("altids", []).append(
+        return vocabularies.get_items_by_qcode("place_custom")
+
+    def _format_planning_ids(self, altids, article):
+        with timings.stage(timings.DB):
+            planning_id, event_id = planning_ids.resolver.get(article["assignment_id"])
+        if planning_id:
+            altids.append(
                 {
                     "role": "PLANNING-ID",
-                    "value": assignment["planning_item"],
+                    "value": planning_id,
                 }
             )
-            planning = get_resource_service("planning").find_one(
-                req=None, _id=assignment["planning_item"]
-            )
-            if planning and planning.get("event_item"):
-                ninjs["altids"].append(
+            if event_id:
+                altids.append(
                     {
                         "role": "EVENT-ID",
-                        "value": planning["event_item"],
+                        "value": event_id,
                     }
                 )
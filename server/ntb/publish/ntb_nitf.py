@@ -10,43 +10,42 @@
 
 import re
 import ntb
-import pytz
 import logging
 import superdesk
 
 from lxml import etree
-from copy import deepcopy
-from datetime import datetime
 from flask import current_app as app
 
 from superdesk import etree as sd_etree, get_resource_service
-from superdesk.metadata.item import ITEM_TYPE, CONTENT_TYPE
+from superdesk.metadata.item import ITEM_TYPE, CONTENT_TYPE, PUBLISH_STATES
 from superdesk.publish.formatters.nitf_formatter import NITFFormatter, EraseElement
 from superdesk.publish.publish_service import PublishService
 from superdesk.errors import FormatterError
 from superdesk.text_utils import get_text
+from superdesk.utc import utcnow
 
-from . import utils
+from ntb import content_profiles, timezones, vocabularies
+from ntb.cache import LRUCache
+from . import body, timings, utils
+from .batch import BatchFormatterMixin, generate_sequence_numbers
 
 logger = logging.getLogger(__name__)
-tz = None
 
 
 FILENAME_FORBIDDEN_RE = re.compile(r"[^a-zA-Z0-9._-]")
 ENCODING = "iso-8859-1"
 assert ENCODING != "unicode"  # use e.g. utf-8 for unicode
+IPTC_SEQUENCE_PLACEHOLDER = "{NTBIPTCSequence}"
+IPTC_SEQUENCE_KEY = "ntb_iptc_sequence_{date}"
+
+render_cache = LRUCache(maxsize=100)
 
 
 def get_content_field(article, field):
-    content_type = get_resource_service("content_types").find_one(
-        req=None, _id=article["profile"]
-    )
-    if not content_type:
-        return
-    return content_type.get("schema", {}).get(field)
+    return content_profiles.get_schema(article["profile"]).get(field)
 
 
-class NTBNITFFormatter(NITFFormatter):
+class NTBNITFFormatter(BatchFormatterMixin, NITFFormatter):
     """This is NITF formatter 1.0 generating single file with first service only."""
 
     XML_DECLARATION = '<?xml version="1.0" encoding="iso-8859-1" standalone="yes"?>'
@@ -58,7 +57,6 @@ class NTBNITFFormatter(NITFFormatter):
         NITFFormatter.__init__(self)
         self.HTML2NITF["p"]["filter"] = self.p_filter
         self._topics_mapping = None
-        self._places = None
 
     def can_format(self, format_type, article):
         """
@@ -72,42 +70,78 @@ class NTBNITFFormatter(NITFFormatter):
         )
 
     def format(self, original_article, subscriber, codes=None, encoding="us-ascii"):
-        article = deepcopy(original_article)
-        self._populate_metadata(article)
-        global tz
-        if tz is None:
-            # first time this method is launched
-            # we set timezone and NTB specific filter
-            tz = pytz.timezone(app.config.get("DEFAULT_TIMEZONE", "Europe/Oslo"))
+        return self._format(
+            original_article, subscriber, generate_sequence_numbers(subscriber), codes
+        )
+
+    def _format(self, original_article, subscriber, sequence_numbers, codes=None):
         try:
+            with timings.item(self.type, original_article.get("_id")):
+                with timings.stage(timings.DB):
+                    pub_seq_num = next(sequence_numbers)
+                # rendered nitf doesn't depend on subscriber,
+                # so it's only done once when item is sent to multiple subscribers
+                cache_key = self._get_render_cache_key(original_article)
+                rendered = render_cache.get(cache_key) if cache_key else None
+                if rendered is None:
+                    rendered = self._render(original_article, subscriber, pub_seq_num)
+                    if cache_key:
+                        render_cache.set(cache_key, rendered)
+                encoded, filename = rendered
+
+                if app.config.get("NTB_IPTC_SEQUENCE"):
+                    with timings.stage(timings.DB):
+                        daily_count = self._get_daily_count()
+                    encoded = encoded.replace(
+                        IPTC_SEQUENCE_PLACEHOLDER.encode(ENCODING),
+                        str(daily_count).encode(ENCODING),
+                        1,
+                    )
+
+            return [
+                {
+                    "published_seq_num": pub_seq_num,
+                    # unicode version used for preview is decoded from encoded one
+                    # (non latin-1 chars are kept as char references)
+                    "formatted_item": encoded.decode(ENCODING),
+                    "encoded_item": encoded,
+                    # used by NTBPublishService to avoid parsing formatted_item
+                    "filename": filename,
+                }
+            ]
+        except Exception as ex:
+            raise FormatterError.nitfFormatterError(ex, subscriber)
+
+    def _render(self, original_article, subscriber, pub_seq_num):
+        """Render article to encoded NITF, return it with its filename."""
+        # shallow copy is enough, formatting only sets or removes top level keys
+        # nested values are shared with original article so those must be replaced
+        # instead of being modified in place
+        article = dict(original_article)
+        with timings.stage(timings.METADATA):
+            self._populate_metadata(article)
             if article.get("body_html"):
                 article["body_html"] = article["body_html"].replace("<br>", "<br />")
-            pub_seq_num = get_resource_service("subscribers").generate_sequence_number(
-                subscriber
-            )
             nitf = self.get_nitf(article, subscriber, pub_seq_num)
             try:
                 nitf.attrib["baselang"] = utils.get_language(article)
             except KeyError:
                 pass
-
-            encoded = etree.tostring(
+        with timings.stage(timings.SERIALISE):
+            encoded = (self.XML_DECLARATION + "\n").encode(ENCODING) + etree.tostring(
                 nitf, encoding=ENCODING, xml_declaration=False, pretty_print=True
             )
-
-            return [
-                {
-                    "published_seq_num": pub_seq_num,
-                    # formatted_item can be used for preview, so we keep unicode version there
-                    "formatted_item": self.XML_DECLARATION
-                    + "\n"
-                    + etree.tostring(nitf, encoding="unicode"),
-                    "encoded_item": (self.XML_DECLARATION + "\n").encode(ENCODING)
-                    + encoded,
-                }
-            ]
-        except Exception as ex:
-            raise FormatterError.nitfFormatterError(ex, subscriber)
+        return encoded, self._get_filename(article)
+
+    def _get_render_cache_key(self, article):
+        """Get render cache key, only published items versions are cached."""
+        if article.get("state") not in PUBLISH_STATES or not article.get("_current_version"):
+            return None
+        services = tuple(
+            service.get("qcode") or service.get("name")
+            for service in article.get("anpa_category") or []
+        )
+        return (article.get("_id"), article["_current_version"], self.FORMAT_TYPE, services)
 
     def _populate_metadata(self, article):
         """
@@ -115,22 +149,22 @@ class NTBNITFFormatter(NITFFormatter):
         """
         fields = {"place": "place_custom", "subject": "subject_custom"}
         for field, scheme in fields.items():
-            vocabulary_items = get_resource_service("vocabularies").get_items(scheme)
             field_values = [
                 val for val in article.get(field, []) if val.get("scheme") == scheme
             ]
+            parents = []
             for value in field_values:
                 if not value.get("parent"):
                     continue
                 parent = self._get_list_element(field_values, "qcode", value["parent"])
                 if parent:  # it's there already
                     continue
-                parent = self._get_list_element(
-                    vocabulary_items, "qcode", value["parent"]
-                )
+                parent = vocabularies.get_item(scheme, value["parent"])
                 if parent:
-                    parent["scheme"] = scheme
-                    article[field].append(parent)
+                    parents.append(dict(parent))
+            if parents:
+                # list may be shared with the original article
+                article[field] = article[field] + parents
 
     def _get_list_element(self, items, key, value):
         """
@@ -147,12 +181,12 @@ class NTBNITFFormatter(NITFFormatter):
         """
         if p_elem.get("class") == "ntb-media":
             raise EraseElement("Element need to be erased")
-        parent = p_elem.find("..")
-        children = list(parent)
-        idx = children.index(p_elem)
+        # only previous sibling is needed, avoid listing parent children
+        # which would be quadratic for long bodies
+        previous = p_elem.getprevious()
         if (
-            idx > 0
-            and children[idx - 1].tag == "hl2"
+            previous is not None
+            and previous.tag == "hl2"
             or p_elem.attrib.get("class", None) == "footer-txt"
         ):
             p_elem.attrib["class"] = "txt"
@@ -186,7 +220,7 @@ class NTBNITFFormatter(NITFFormatter):
             "date.issue",
             attrib={
                 "norm": article["versioncreated"]
-                .astimezone(tz)
+                .astimezone(timezones.get_default_timezone())
                 .strftime("%Y-%m-%dT%H:%M:%S")
             },
         )
@@ -223,10 +257,7 @@ class NTBNITFFormatter(NITFFormatter):
 
     @property
     def places(self):
-        if not self._places:
-            places = get_resource_service("vocabularies").get_items("place_custom")
-            self._places = {p["qcode"]: p for p in places}
-        return self._places
+        return vocabularies.get_items_by_qcode("place_custom")
 
     def _format_place(self, article, docdata):
         mapping = (
@@ -256,7 +287,7 @@ class NTBNITFFormatter(NITFFormatter):
                     evloc.attrib[attrib] = ""
 
     def _format_pubdata(self, article, head):
-        pub_date = article["versioncreated"].astimezone(tz).strftime("%Y%m%dT%H%M%S")
+        pub_date = article["versioncreated"].astimezone(timezones.get_default_timezone()).strftime("%Y%m%dT%H%M%S")
         pubdata = etree.SubElement(
             head, "pubdata", attrib={"date.publication": pub_date}
         )
@@ -325,7 +356,7 @@ class NTBNITFFormatter(NITFFormatter):
                 )
 
     def _format_datetimes(self, article, head):
-        created = article["versioncreated"].astimezone(tz)
+        created = article["versioncreated"].astimezone(timezones.get_default_timezone())
         etree.SubElement(
             head,
             "meta",
@@ -347,7 +378,7 @@ class NTBNITFFormatter(NITFFormatter):
         """
         metadata = {}
         metadata["date"] = (
-            article["versioncreated"].astimezone(tz).strftime("%Y-%m-%d_%H-%M-%S")
+            article["versioncreated"].astimezone(timezones.get_default_timezone()).strftime("%Y-%m-%d_%H-%M-%S")
         )
         try:
             metadata["service"] = article["anpa_category"][0]["name"]
@@ -403,17 +434,10 @@ class NTBNITFFormatter(NITFFormatter):
         )
         etree.SubElement(head, "meta", {"name": "NTBKanal", "content": "A"})
 
-        # daily counter
+        # daily counter, value is set in format as it changes for every output
         if app.config.get("NTB_IPTC_SEQUENCE"):
-            day_start = datetime.now().replace(
-                hour=0, minute=0, second=0, microsecond=0
-            )
-            pub_queue = get_resource_service("publish_queue")
-            daily_count = (
-                pub_queue.find({"transmit_started_at": {"$gte": day_start}}).count() + 1
-            )
             etree.SubElement(
-                head, "meta", {"name": "NTBIPTCSequence", "content": str(daily_count)}
+                head, "meta", {"name": "NTBIPTCSequence", "content": IPTC_SEQUENCE_PLACEHOLDER}
             )
 
         # name
@@ -424,6 +448,17 @@ class NTBNITFFormatter(NITFFormatter):
         else:
             etree.SubElement(head, "meta", {"name": "NTBKilde", "content": name})
 
+    def _get_daily_count(self):
+        """Get next value of the daily counter.
+
+        Counter is stored per local date so it starts again from 1 at midnight,
+        it's incremented atomically so it's safe to use from multiple workers.
+        """
+        today = utcnow().astimezone(timezones.get_default_timezone()).date()
+        return get_resource_service("sequences").get_next_sequence_number(
+            IPTC_SEQUENCE_KEY.format(date=today.isoformat())
+        )
+
     def _format_service(self, article):
         try:
             return article["anpa_category"][0].get("name")
@@ -497,21 +532,13 @@ class NTBNITFFormatter(NITFFormatter):
             abstract_txt = etree.tostring(abstract, encoding="unicode", method="text")
             p.text = abstract_txt
 
-        html, media_data = utils.format_body_content(article)
+        # regular content
+        with timings.stage(timings.BODY):
+            html_elts, media_data = body.pipeline.parse_xml(article)
 
         # at this point we have media data filled in right order
         # and no more embedded in html
 
-        # regular content
-        # we use XMLParser instead of HTMLParser here because HTMLParser will not remove all whitespace
-        # resulting in trouble when pretty printing
-        # (cf. http://lxml.de/FAQ.html#why-doesn-t-the-pretty-print-option-reformat-my-xml-output)
-        parser = etree.XMLParser(recover=True, remove_blank_text=True)
-        try:
-            html_elts = etree.fromstring("".join(("<div>", html, "</div>")), parser)
-        except Exception as e:
-            raise ValueError("Can't parse body_html content: {}".format(e))
-
         # <p class="lead" lede="true"> is used by NTB for abstract
         # and it may be existing in body_html (from ingested items ?)
         # so we need to remove it here
@@ -533,10 +560,9 @@ class NTBNITFFormatter(NITFFormatter):
 
         # count is done here as superdesk.etree.get_char_count expect a text
         # which would imply a useless serialisation/reparsing
-        body_nitf = self.html2nitf(html_elts, attr_remove=["style"])
-        body_nitf_text = etree.tostring(body_nitf, encoding="unicode", method="text")
-        # we don't want to count line feeds
-        char_count = len(body_nitf_text.replace("\n", ""))
+        with timings.stage(timings.HTML2NITF):
+            body_nitf = self.html2nitf(html_elts, attr_remove=["style"])
+        char_count = body.get_char_count(body_nitf)
 
         if body_nitf.text:
             # if body_nitf has text, we need to include it in body_content or it will be lost
@@ -553,7 +579,7 @@ class NTBNITFFormatter(NITFFormatter):
         pubdata.set("unit-of-measure", "character")
 
         # media
-        for data in media_data:
+        for data, featured in media_data:
             source = self._get_media_source(data)
             if not source:
                 continue
@@ -570,7 +596,6 @@ class NTBNITFFormatter(NITFFormatter):
             mime_type = data.get("mimetype")
             # featured is not None if we have a feature image/media
             # the value of image/media is not used yet but may be in the future
-            featured = data.get("_featured")
             if mime_type is None:
                 # these default values need to be used if mime_type is not found
                 mime_type = (
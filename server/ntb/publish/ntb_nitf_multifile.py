@@ -19,19 +19,22 @@ class NTBNITFMultiFileFormatter(NTBNITFFormatter):
     type = FORMAT_TYPE
     name = "NTB NITF Multi File"
 
-    def format(self, original_article, subscriber, codes=None, encoding="us-ascii"):
+    def _format(self, original_article, subscriber, sequence_numbers, codes=None):
         """For every service create a article nitf format."""
         if len(original_article.get('anpa_category', [])) <= 1:
-            return super().format(original_article, subscriber, codes, encoding)
+            return super()._format(original_article, subscriber, sequence_numbers, codes)
 
         article = original_article.copy()
         articles = []
 
         for service in original_article['anpa_category']:
             article['anpa_category'] = [service]
-            articles += super().format(article, subscriber, codes, encoding)
+            articles += super()._format(article, subscriber, sequence_numbers, codes)
 
         return articles
 
+    def _count_sequence_numbers(self, article):
+        return max(1, len(article.get('anpa_category') or []))
+
 
 PublishService.register_file_extension(NTBNITFMultiFileFormatter.FORMAT_TYPE, 'xml')
@@ -19,18 +19,20 @@ class NTBPublishService(PublishService):
 
     @classmethod
     def get_filename(cls, item):
-        # we reparse formatted item to get filename from <meta name="filename"> element
-        # this way we are sure that we have the exact same filename
-        try:
-            xml = ET.fromstring(item['formatted_item'])
-        except (KeyError, ET.ParseError) as e:
-            filename = None
-            logger.error("Error on parsing, can't get filename: {}".format(e))
-        else:
+        # filename is set by NTB NITF formatters, this way we are sure
+        # that we have the exact same filename as in <meta name="filename">
+        filename = item.get("filename")
+        if not filename and item.get("formatted_item"):
+            # items queued before filename was added, reparse formatted item
             try:
-                filename = xml.find('head/meta[@name="filename"]').attrib['content']
-            except AttributeError:
-                filename = None
+                xml = ET.fromstring(item["formatted_item"])
+            except ET.ParseError as e:
+                logger.error("Error on parsing, can't get filename: {}".format(e))
+            else:
+                try:
+                    filename = xml.find('head/meta[@name="filename"]').attrib['content']
+                except AttributeError:
+                    filename = None
         if not filename:
             return super(NTBPublishService, cls).get_filename(item)
         return filename
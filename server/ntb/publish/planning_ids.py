@@ -0,0 +1,107 @@
+"""Resolve planning and event ids of coverage items.
+
+Published coverage items only keep the assignment id, so its planning item
+and event must be looked up. Assignments rarely change once item is published,
+so ids resolved to both planning and event are kept in memory, until
+the assignment or planning item is modified in this process.
+"""
+
+from typing import Dict, Iterable, Optional, Tuple
+from superdesk import get_resource_service
+
+from ntb.cache import LRUCache
+
+MAXSIZE = 1000
+
+#: (planning id, event id)
+PlanningIds = Tuple[Optional[str], Optional[str]]
+
+
+class PlanningIdsResolver:
+    """Resolve assignment -> planning -> event ids using one query per resource."""
+
+    def __init__(self, maxsize=MAXSIZE):
+        self._cache = LRUCache(maxsize=maxsize)
+
+    def get(self, assignment_id) -> PlanningIds:
+        return self.resolve([assignment_id]).get(str(assignment_id), (None, None))
+
+    def resolve(self, assignment_ids: Iterable) -> Dict[str, PlanningIds]:
+        """Get planning and event ids for every assignment.
+
+        :return: ids indexed by assignment id converted to string
+        """
+        resolved = {}
+        missing = {}
+        for assignment_id in assignment_ids:
+            key = str(assignment_id)
+            ids = self._cache.get(key)
+            if ids is not None:
+                resolved[key] = ids
+            else:
+                missing[key] = assignment_id
+
+        if not missing:
+            return resolved
+
+        assignments = get_resource_service("assignments").find(
+            {"_id": {"$in": list(missing.values())}}
+        )
+        planning_ids = {
+            str(assignment["_id"]): assignment.get("planning_item")
+            for assignment in assignments
+        }
+
+        events_ids = {}
+        if any(planning_ids.values()):
+            plannings = get_resource_service("planning").find(
+                {"_id": {"$in": list({_id for _id in planning_ids.values() if _id})}}
+            )
+            events_ids = {
+                planning["_id"]: planning.get("event_item") for planning in plannings
+            }
+
+        for key in missing:
+            planning_id = planning_ids.get(key)
+            ids = (planning_id, events_ids.get(planning_id) if planning_id else None)
+            if all(ids):
+                # incomplete ones might be linked later
+                self._cache.set(key, ids)
+            resolved[key] = ids
+        return resolved
+
+    def invalidate(self, assignment_id) -> None:
+        self._cache.pop(str(assignment_id))
+
+    def clear(self) -> None:
+        self._cache.clear()
+
+
+resolver = PlanningIdsResolver()
+
+
+def _on_assignment_updated(updates, original):
+    resolver.invalidate(original.get("_id"))
+
+
+def _on_assignment_deleted(doc):
+    resolver.invalidate(doc.get("_id"))
+
+
+def _on_planning_updated(updates, original):
+    if "event_item" in updates:
+        # cached ids are not indexed by planning, it's rare anyway
+        resolver.clear()
+
+
+def _on_planning_deleted(doc):
+    resolver.clear()
+
+
+def init_app(app):
+    # new app might use other database
+    resolver.clear()
+    app.on_updated_assignments += _on_assignment_updated
+    app.on_deleted_item_assignments += _on_assignment_deleted
+    app.on_updated_planning += _on_planning_updated
+    app.on_deleted_item_planning += _on_planning_deleted
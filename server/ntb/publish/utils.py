@@ -1,21 +1,31 @@
 import re
 import logging
-from typing import Dict, List, Optional, Tuple
+from typing import List, Mapping, NamedTuple, Optional, Tuple
 
 
 LANGUAGE = "nb-NO"  # default language for ntb
 
-EMBED_RE = re.compile(
-    r"<!-- EMBED START ([a-zA-Z]+ {id: \"(?P<id>.+?)\"}) -->.*"
-    r"<!-- EMBED END \1 -->",
-    re.DOTALL,
-)
-
 STRIP_INVALID_CHARS_RE = re.compile("[\x00-\x08\x0B-\x0C\x0E-\x1F\x7F]")
 
+#: tokens handled by body preprocessing: embed markers, invalid chars and nbsp
+BODY_TOKEN_RE = re.compile(
+    r"<!-- EMBED (?P<marker>START|END) (?P<label>[a-zA-Z]+ {id: \"(?P<id>[^\"\n]+)\"}) -->"
+    r"|(?P<nbsp>&nbsp;)"
+    r"|[\x00-\x08\x0B-\x0C\x0E-\x1F\x7F]+"
+)
+
 logger = logging.getLogger(__name__)
 
 
+class Media(NamedTuple):
+    """Media item used in article body."""
+
+    #: association, shared with the article so it must not be modified
+    data: Mapping
+    #: ``image`` or ``media`` for feature image/media
+    featured: Optional[str] = None
+
+
 def get_language(article) -> str:
     return article.get("language") or LANGUAGE
 
@@ -48,49 +58,72 @@ def strip_invalid_chars(string: Optional[str]) -> str:
     return STRIP_INVALID_CHARS_RE.sub("", string)
 
 
-def format_body_content(article) -> Tuple[str, List[Dict]]:
-    # media
+def format_body_content(article) -> Tuple[str, List[Media]]:
+    """Get body HTML ready to be parsed and media used in the body.
+
+    Embedded items are removed from the body, invalid chars are stripped
+    and non breaking spaces are replaced, all in a single scan of the body.
+
+    :return: body HTML and media, feature media first and then embedded
+        ones in order of appearance
+    """
     media_data = []
-    try:
-        associations = article["associations"]
-    except KeyError:
-        pass
-    else:
+    associations = article.get("associations")
+    if associations is not None:
         feature_image = associations.get("featureimage")
         if feature_image is not None:
-            feature_image["_featured"] = "image"
-            media_data.append(feature_image)
+            media_data.append(Media(feature_image, "image"))
         else:
             feature_media = associations.get("featuremedia")
             if feature_media is not None:
-                feature_media["_featured"] = "media"
-                media_data.append(feature_media)
-
-    def repl_embedded(match):
-        """Embedded in body_html handling"""
-        # this method do 2 important things:
-        # - it remove the embedded from body_html
-        # - it fill media_data with embedded data in order of appearance
-        id_ = match.group("id")
-        try:
-            data = associations[id_]
-        except KeyError:
-            logger.warning("Expected association {} not found!".format(id_))
+                media_data.append(Media(feature_media, "media"))
+
+    html = article.get("body_html") or ""
+    tokens = list(BODY_TOKEN_RE.finditer(html))
+    # embedded item is removed up to the last end marker with same label
+    embed_ends = {
+        token.group("label"): token
+        for token in tokens
+        if token.group("marker") == "END"
+    }
+
+    chunks = []
+    pos = 0
+    for token in tokens:
+        start = token.start()
+        if start < pos:
+            # inside of removed embed
+            continue
+        marker = token.group("marker")
+        if marker == "END":
+            continue
+        elif marker == "START":
+            end_token = embed_ends.get(token.group("label"))
+            if end_token is None or end_token.start() < token.end():
+                continue
+            chunks.append(html[pos:start])
+            pos = end_token.end()
+            _add_embedded(media_data, associations, token.group("id"))
         else:
-            if data is None:
-                logger.warning(
-                    "media data for association {} is empty, ignoring!".format(id_)
-                )
-            else:
-                media_data.append(data)
-        return ""
+            chunks.append(html[pos:start])
+            # it is a request from SDNTB-388 to use normal space instead of non breaking spaces
+            if token.group("nbsp"):
+                chunks.append(" ")
+            pos = token.end()
+    chunks.append(html[pos:])
 
-    html = strip_invalid_chars(
-        EMBED_RE.sub(repl_embedded, article.get("body_html") or "")
-    )
+    return "".join(chunks), media_data
 
-    # it is a request from SDNTB-388 to use normal space instead of non breaking spaces
-    # so we do this replace
-    html = html.replace("&nbsp;", " ")
 
-    return html, media_data
+def _add_embedded(media_data, associations, id_) -> None:
+    try:
+        data = associations[id_]
+    except (KeyError, TypeError):
+        logger.warning("Expected association {} not found!".format(id_))
+    else:
+        if data is None:
+            logger.warning(
+                "media data for association {} is empty, ignoring!".format(id_)
+            )
+        else:
+            media_data.append(Media(data))
@@ -0,0 +1,95 @@
+"""Performance benchmarks.
+
+These are not collected by the test runner, run them as modules, e.g.::
+
+    python -m ntb.tests.benchmarks.mediatopics_to_subject_mapping_bench
+
+"""
+
+import math
+import flask
+import time
+import tracemalloc
+
+from contextlib import contextmanager
+from unittest.mock import patch
+
+from ntb.tests.mock import resources
+
+
+@contextmanager
+def app_context():
+    """Flask app context with mocked superdesk resources."""
+    app = flask.Flask(__name__)
+    app.cache = None
+    # core defaults are used by formatters, e.g. DATE_FORMAT
+    app.config.from_object("superdesk.default_settings")
+    app.config.from_object("settings")
+    with app.app_context(), patch.dict("superdesk.resources", resources):
+        yield app
+
+
+def run(label, func, items):
+    start = time.perf_counter()
+    for item in items:
+        func(item)
+    elapsed = time.perf_counter() - start
+    print(
+        "{label}: {count} items in {elapsed:.3f}s ({rate:.0f} items/s)".format(
+            label=label,
+            count=len(items),
+            elapsed=elapsed,
+            rate=len(items) / elapsed if elapsed else 0,
+        )
+    )
+    return elapsed
+
+
+def peak_memory(label, func, items):
+    tracemalloc.start()
+    try:
+        for item in items:
+            func(item)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    print("{label}: peak memory {peak:.1f} KiB".format(label=label, peak=peak / 1024))
+    return peak
+
+
+def percentile(values, percent):
+    """Get nearest-rank percentile of values."""
+    ordered = sorted(values)
+    rank = math.ceil(len(ordered) * percent / 100)
+    return ordered[max(0, rank - 1)]
+
+
+def measure(func, items, memory_items=3, warmup=3):
+    """Measure throughput, median and p95 latency and peak memory of calling func for items.
+
+    First ``warmup`` items are formatted before timing so caches and lazy
+    imports don't count. Latency is timed for every item, peak memory is traced
+    separately for first ``memory_items`` items as tracing slows calls down.
+    """
+    for item in items[:warmup]:
+        func(item)
+    latencies = []
+    for item in items:
+        start = time.perf_counter()
+        func(item)
+        latencies.append(time.perf_counter() - start)
+    peak = 0
+    for item in items[:memory_items]:
+        tracemalloc.start()
+        try:
+            func(item)
+            peak = max(peak, tracemalloc.get_traced_memory()[1])
+        finally:
+            tracemalloc.stop()
+    elapsed = sum(latencies)
+    return {
+        "throughput": len(items) / elapsed if elapsed else 0,
+        "median_ms": percentile(latencies, 50) * 1000,
+        "p95_ms": percentile(latencies, 95) * 1000,
+        "peak_kib": peak / 1024,
+    }
@@ -0,0 +1,52 @@
+"""Convert test fixtures bodies to NITF.
+
+Compares body conversion using shared parser and character count
+done on the tree with new parser and text serialisation for every item
+which was done before.
+"""
+
+import json
+import pathlib
+
+from lxml import etree
+
+from ntb.publish import body, utils
+from ntb.publish.ntb_nitf import NTBNITFFormatter
+from ntb.tests.benchmarks import app_context, run
+from ntb.tests.publish.ntb_nitf_test import ARTICLE, ARTICLE_WITH_IMATRICS_FIELDS
+
+FIXTURES = pathlib.Path(__file__).parent.parent / "publish" / "fixtures"
+ROUNDS = 2000
+
+
+def legacy(formatter, article):
+    html, _ = utils.format_body_content(article)
+    parser = etree.XMLParser(recover=True, remove_blank_text=True)
+    html_elts = etree.fromstring("".join(("<div>", html, "</div>")), parser)
+    body_nitf = formatter.html2nitf(html_elts, attr_remove=["style"])
+    text = etree.tostring(body_nitf, encoding="unicode", method="text")
+    return etree.tostring(body_nitf), len(text.replace("\n", ""))
+
+
+def current(formatter, article):
+    html_elts, _ = body.pipeline.parse_xml(article)
+    body_nitf = formatter.html2nitf(html_elts, attr_remove=["style"])
+    return etree.tostring(body_nitf), body.get_char_count(body_nitf)
+
+
+def main():
+    articles = [ARTICLE, ARTICLE_WITH_IMATRICS_FIELDS]
+    for path in sorted(FIXTURES.glob("*.json")):
+        with path.open() as f:
+            articles.append(json.load(f))
+    items = articles * (ROUNDS // len(articles))
+    with app_context():
+        formatter = NTBNITFFormatter()
+        for article in articles:
+            assert legacy(formatter, article) == current(formatter, article), "output differs"
+        run("before", lambda article: legacy(formatter, article), items)
+        run("after", lambda article: current(formatter, article), items)
+
+
+if __name__ == "__main__":
+    main()
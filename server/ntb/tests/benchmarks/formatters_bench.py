@@ -0,0 +1,240 @@
+"""Format generated NTB items with every registered NTB formatter.
+
+Reports throughput, median and p95 latency and peak memory of each formatter
+for small, medium and large items::
+
+    python -m ntb.tests.benchmarks.formatters_bench --save baseline.json
+    python -m ntb.tests.benchmarks.formatters_bench --compare baseline.json --threshold 20
+
+When comparing, it exits with non-zero status if median latency, p95 latency
+or peak memory is worse than baseline by more than threshold percent.
+Throughput is only reported as a single slow call skews it.
+"""
+
+import sys
+import json
+import argparse
+import datetime
+
+from contextlib import ExitStack
+from unittest.mock import patch
+
+# formatters are registered on import
+import ntb.publish  # noqa
+from superdesk.publish.formatters import formatters
+
+from ntb.tests.benchmarks import app_context, measure
+
+FORMAT_TYPES = (
+    "ntbnitf10",
+    "ntbnitf",
+    "ntbnitfmedia",
+    "ntbnitf20",
+    "ntbnitfmedia20",
+    "ntbnitfmultifile",
+    "ntb_ninjs",
+    "ntb_event",
+)
+
+# (paragraphs, associations, services)
+SIZES = (
+    (1, 0, 1),
+    (50, 10, 3),
+    (500, 50, 6),
+)
+
+ROUNDS = 20
+# fewer rounds are too noisy to compare with baseline
+MIN_COMPARE_ROUNDS = 10
+THRESHOLD = 20
+
+SERVICES = [
+    {"qcode": "n", "name": "Nyhetstjenesten"},
+    {"qcode": "s", "name": "Sporten"},
+    {"qcode": "e", "name": "Utenriks"},
+    {"qcode": "t", "name": "Kultur"},
+    {"qcode": "m", "name": "Nyheter Økonomi"},
+    {"qcode": "j", "name": "Nyheter Showbiz"},
+]
+
+RENDITIONS = ("original", "baseImage", "viewImage", "thumbnail", "16-9", "4-3")
+
+
+def generate_article(paragraphs, associations, services, index=0):
+    now = datetime.datetime.now(datetime.timezone.utc)
+    body = []
+    media = {}
+    for i in range(paragraphs):
+        body.append(
+            "<p>Avsnitt {} med <b>uthevet</b> tekst og <a href=\"https://ntb.no\">lenke</a>."
+            " Æ, ø og å skal kodes riktig.</p>".format(i)
+        )
+        if i < associations:
+            embed_id = "embedded{}".format(i)
+            body.append(
+                '<!-- EMBED START Image {{id: "{id}"}} --><figure><img src="foo.jpg" />'
+                "<figcaption>bilde {i}</figcaption></figure>"
+                '<!-- EMBED END Image {{id: "{id}"}} -->'.format(id=embed_id, i=i)
+            )
+    for i in range(associations):
+        embed_id = "embedded{}".format(i)
+        media[embed_id] = {
+            "_id": embed_id,
+            "guid": embed_id,
+            "type": "picture",
+            "headline": "bilde",
+            "language": "nb-NO",
+            "description_text": "Bilde {} ".format(i) * 20,
+            "renditions": {
+                name: {
+                    "href": "http://example.com/{}/{}.jpg".format(name, i),
+                    "mimetype": "image/jpeg",
+                    "width": 1400,
+                    "height": 1400,
+                }
+                for name in RENDITIONS
+            },
+            "versioncreated": now,
+        }
+    if media:
+        media["featuremedia"] = media["embedded0"]
+    guid = "urn:bench:{}".format(index)
+    return {
+        "_id": guid,
+        "guid": guid,
+        "family_id": guid,
+        "type": "text",
+        "state": "in_progress",
+        "language": "nb-NO",
+        "pubstatus": "usable",
+        "urgency": 3,
+        "headline": "Benchmark",
+        "slugline": "benchmark",
+        "abstract": "<p>Ingress</p>",
+        "byline": "NTB",
+        "firstcreated": now,
+        "versioncreated": now,
+        "body_html": "".join(body),
+        "anpa_category": SERVICES[:services],
+        "genre": [{"qcode": "Nyheter", "name": "Nyheter", "scheme": "genre_custom"}],
+        "subject": [
+            {"qcode": "Innenriks", "name": "Innenriks", "scheme": "category"},
+            {"qcode": "02001003", "parent": "02000000", "name": "foo", "scheme": "subject_custom"},
+        ],
+        "place": [{"qcode": "Oslo", "name": "Oslo", "scheme": "place_custom"}],
+        "associations": media,
+    }
+
+
+def generate_event(paragraphs, associations, services, index=0):
+    """Event has no body or associations, its description and metadata grow instead."""
+    return {
+        "_id": "urn:bench:event:{}".format(index),
+        "type": "event",
+        "name": "Benchmark",
+        "firstcreated": "2016-10-31T08:27:25+0000",
+        "versioncreated": "2016-10-31T09:33:40+0000",
+        "dates": {
+            "start": "2016-10-31T23:00:00+0000",
+            "end": "2016-11-01T22:59:59+0000",
+            "tz": "Europe/Oslo",
+        },
+        "definition_short": "Beskrivelse av hendelsen. " * paragraphs,
+        "anpa_category": SERVICES[:services],
+        "subject": [{"qcode": "Innenriks", "name": "Innenriks", "scheme": "category"}] + [
+            {"qcode": "0600{}000".format(i), "name": "emne {}".format(i), "scheme": "subject_custom"}
+            for i in range(associations)
+        ],
+        "location": [
+            {
+                "name": "Oslo rådhus",
+                "location": {"lat": 59.9119, "lon": 10.7336},
+                "address": {"line": ["Rådhusplassen 1"], "locality": "Oslo", "country": "Norge"},
+            }
+        ],
+        "links": ["https://ntb.no"],
+    }
+
+
+def get_formatters():
+    registered = {getattr(formatter, "type", None): formatter for formatter in formatters}
+    return [(format_type, registered[format_type]()) for format_type in FORMAT_TYPES]
+
+
+def run_benchmarks(rounds=ROUNDS):
+    """Get results for every formatter and size, keyed by ``formatter/size``."""
+    results = {}
+    subscriber = {"_id": "bench", "name": "bench"}
+    for format_type, formatter in get_formatters():
+        generate = generate_event if format_type == "ntb_event" else generate_article
+        for size in SIZES:
+            key = "{}/p{}-a{}-s{}".format(format_type, *size)
+            items = [generate(*size, index=i) for i in range(rounds)]
+            assert formatter.can_format(format_type, items[0]), key
+            results[key] = measure(lambda item: formatter.format(item, subscriber), items)
+            print(
+                "{key}: {throughput:.0f} items/s, median {median_ms:.3f}ms, p95 {p95_ms:.3f}ms,"
+                " peak memory {peak_kib:.1f} KiB".format(
+                    key=key, **results[key]
+                )
+            )
+    return results
+
+
+def find_regressions(results, baseline, threshold):
+    """Get results worse than baseline by more than threshold percent."""
+    limit = threshold / 100
+    regressions = []
+    for key, result in results.items():
+        expected = baseline.get(key)
+        if not expected:
+            continue
+        for metric in ("median_ms", "p95_ms", "peak_kib"):
+            # baseline might be saved before metric was added
+            if metric in expected and result[metric] > expected[metric] * (1 + limit):
+                regressions.append(
+                    "{key} {metric}: {value:.3f} (baseline {expected:.3f})".format(
+                        key=key, metric=metric, value=result[metric], expected=expected[metric]
+                    )
+                )
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--rounds", type=int, default=ROUNDS, help="items formatted for every size")
+    parser.add_argument("--save", help="save results as baseline to this file")
+    parser.add_argument("--compare", help="compare results with baseline from this file")
+    parser.add_argument(
+        "--threshold", type=float, default=THRESHOLD, help="allowed regression in percent (default: %(default)s)"
+    )
+    args = parser.parse_args(argv)
+    if args.compare and args.rounds < MIN_COMPARE_ROUNDS:
+        parser.error("--compare needs at least {} rounds".format(MIN_COMPARE_ROUNDS))
+
+    with app_context(), ExitStack() as stack:
+        # related content fields would be looked up in vocabularies resource
+        for target in (
+            "superdesk.publish.formatters.ninjs_formatter.is_related_content",
+            "ntb.publish.ntb_ninjs.is_related_content",
+        ):
+            stack.enter_context(patch(target, return_value=False))
+        results = run_benchmarks(args.rounds)
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = find_regressions(results, baseline, args.threshold)
+        for regression in regressions:
+            print("regression: {}".format(regression))
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
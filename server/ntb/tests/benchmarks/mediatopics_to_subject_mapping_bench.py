@@ -0,0 +1,84 @@
+"""Publish synthetic items through the mediatopics mapping hook."""
+
+import ntb
+import copy
+import random
+
+from flask import current_app as app
+from superdesk import get_resource_service
+
+from ntb.tests.benchmarks import app_context, run
+from ntb.mediatopics import get_mediatopics
+from ntb.mediatopics_to_subject_mapping import (
+    MAPPING_CONFIG_KEY,
+    populate_subject,
+    topics_mapping,
+)
+
+ITEMS_COUNT = 10000
+
+
+def legacy_populate_subject(sender, item, **kwargs):
+    """Mapping as it was done before the index, rebuilt for every item."""
+    topics = get_mediatopics(item)
+    if not topics:
+        return
+    mapping = {}
+    cv_topics = get_resource_service("vocabularies").get_items(ntb.MEDIATOPICS_CV)
+    subjects = get_resource_service("vocabularies").get_items(ntb.SUBJECTCODES_CV)
+    for topic in cv_topics:
+        subject_code = app.config[MAPPING_CONFIG_KEY].get(topic["qcode"])
+        if not subject_code and topic["qcode"] in app.config[MAPPING_CONFIG_KEY]:
+            continue
+        if not subject_code and topic.get("iptc_subject"):
+            subject_code = topic["iptc_subject"]
+        if not subject_code:
+            continue
+        for subject in subjects:
+            if subject.get("qcode") == subject_code:
+                mapping[topic["qcode"]] = subject
+                break
+    for topic in topics:
+        subject = mapping.get(topic["qcode"])
+        if subject and not any(
+            s["qcode"] == subject["qcode"] and s.get("scheme") == subject.get("scheme")
+            for s in item["subject"]
+        ):
+            item["subject"].append(subject)
+
+
+def generate_items(count):
+    cv_topics = get_resource_service("vocabularies").get_items(ntb.MEDIATOPICS_CV)
+    rand = random.Random(count)
+    items = []
+    for i in range(count):
+        topics = rand.sample(cv_topics, rand.randint(1, 8))
+        items.append(
+            {
+                "_id": "bench-{}".format(i),
+                "subject": [
+                    {"qcode": t["qcode"], "name": t["name"], "scheme": ntb.MEDIATOPICS_CV}
+                    for t in topics
+                ],
+            }
+        )
+    return items
+
+
+def main():
+    with app_context():
+        items = generate_items(ITEMS_COUNT)
+        before = run(
+            "before",
+            lambda item: legacy_populate_subject(None, item),
+            copy.deepcopy(items),
+        )
+        topics_mapping.clear()
+        after = run(
+            "after", lambda item: populate_subject(None, item), copy.deepcopy(items)
+        )
+        print("speedup: {:.1f}x".format(before / after if after else 0))
+
+
+if __name__ == "__main__":
+    main()
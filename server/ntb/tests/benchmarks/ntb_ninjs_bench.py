@@ -0,0 +1,121 @@
+"""Format articles with many associations using NTB NINJS formatter.
+
+Compares NINJS v2 projection with building legacy NINJS first
+and removing fields not used in v2 which was done before,
+and peak memory of encoding whole NINJS item with streaming encoder.
+"""
+
+import copy
+import datetime
+import json
+
+from contextlib import ExitStack
+from unittest.mock import patch
+from superdesk.publish.formatters.ninjs_formatter import NINJSFormatter
+from superdesk.utils import json_serialize_datetime_objectId
+
+from ntb.publish.ntb_ninjs import NTBNINJSFormatter, convert_dicts_to_lists
+from ntb.tests.benchmarks import app_context, peak_memory, run
+from ntb.tests.benchmarks.ntb_nitf_bench import generate_article
+
+ASSOCIATIONS = 25
+ITEMS = 200
+
+LEGACY_PROPERTIES = {
+    "headlines", "uri", "type", "profile", "version", "firstcreated", "versioncreated",
+    "pubstatus", "contentcreated", "embargoed", "urgency", "copyrightholder",
+    "copyrightnotice", "usageterms", "ednote", "language", "descriptions", "bodies",
+    "people", "organisations", "places", "subjects", "events", "objects", "title", "by",
+    "slugline", "located", "associations", "altids", "trustindicators", "standard",
+    "genre", "rightsinfo", "service", "infosources", "NTBKilde",
+}
+
+
+class LegacyFormatter(NTBNINJSFormatter):
+    def _transform_to_ninjs(self, article, subscriber, recursive=True):
+        ninjs = NINJSFormatter._transform_to_ninjs(self, article, subscriber, recursive)
+        for field, value in (
+            ("people", "person"),
+            ("organisations", "organisation"),
+            ("events", "event"),
+            ("objects", "object"),
+        ):
+            ninjs[field] = self.format_imatrics(article, value)
+        if ninjs.get("headline"):
+            ninjs["headlines"] = self.format_headlines(article)
+        if ninjs.get("description_text"):
+            ninjs["descriptions"] = self.format_descriptions(ninjs)
+        if article.get("body_html"):
+            ninjs["bodies"] = self.format_bodies(article)
+        if ninjs.get("subject"):
+            ninjs["subjects"] = self.format_subjects(ninjs)
+        if ninjs.get("guid"):
+            ninjs.setdefault("uri", ninjs["guid"])
+        for key in list(ninjs.keys()):
+            if key not in LEGACY_PROPERTIES or ninjs[key] is None:
+                ninjs.pop(key)
+        ninjs["altids"] = self._format_altids(article)
+        ninjs["taglines"] = self._format_taglines(article)
+        if article.get("type") == "text":
+            ninjs["infosources"] = self._format_infosources(article)
+        if recursive:
+            convert_dicts_to_lists(ninjs)
+        ninjs["copyrightholder"] = "NTB"
+        return ninjs
+
+
+def main():
+    article = generate_article(embeds=ASSOCIATIONS)
+    article.update(
+        guid=article["_id"],
+        language="nb-NO",
+        pubstatus="usable",
+        urgency=3,
+        firstcreated=datetime.datetime.now(datetime.timezone.utc),
+        abstract="<p>abstract</p>",
+    )
+    for association in article["associations"].values():
+        association.update(language="nb-NO", headline="picture")
+    with app_context(), ExitStack() as stack:
+        for target in (
+            "superdesk.publish.formatters.ninjs_formatter.is_related_content",
+            "ntb.publish.ntb_ninjs.is_related_content",
+        ):
+            stack.enter_context(patch(target, return_value=False))
+        subscriber = {"_id": "bench", "name": "bench"}
+        before, after = LegacyFormatter(), NTBNINJSFormatter()
+        assert before._transform_to_ninjs(copy.deepcopy(article), subscriber) == after._transform_to_ninjs(
+            copy.deepcopy(article), subscriber
+        ), "output differs"
+        # formatting modifies articles, so every run gets its own copies
+        run(
+            "before",
+            lambda item: before._transform_to_ninjs(item, subscriber),
+            [copy.deepcopy(article) for _ in range(ITEMS)],
+        )
+        run(
+            "after",
+            lambda item: after._transform_to_ninjs(item, subscriber),
+            [copy.deepcopy(article) for _ in range(ITEMS)],
+        )
+
+        def dumps(item):
+            return json.dumps(
+                after._transform_to_ninjs(item, subscriber),
+                default=json_serialize_datetime_objectId,
+            )
+
+        def stream(item):
+            for _chunk in after.iter_encode(item, subscriber):
+                pass
+
+        assert dumps(copy.deepcopy(article)) == "".join(
+            after.iter_encode(copy.deepcopy(article), subscriber)
+        ), "encoded output differs"
+        items = [copy.deepcopy(article) for _ in range(ITEMS)]
+        peak_memory("json.dumps", dumps, items[: ITEMS // 2])
+        peak_memory("iter_encode", stream, items[ITEMS // 2:])
+
+
+if __name__ == "__main__":
+    main()
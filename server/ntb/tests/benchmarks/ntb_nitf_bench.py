@@ -0,0 +1,75 @@
+"""Format large articles with embedded media using NITF formatters.
+
+Compares current formatting with the deep copy of the article
+which was done for every subscriber and service before.
+"""
+
+import copy
+import datetime
+
+from ntb.tests.benchmarks import app_context, peak_memory, run
+from ntb.publish.ntb_nitf_multifile import NTBNITFMultiFileFormatter
+
+SUBSCRIBERS = 30
+SERVICES = 4
+EMBEDS = 50
+
+
+class LegacyFormatter(NTBNITFMultiFileFormatter):
+    def format(self, original_article, subscriber, codes=None, encoding="us-ascii"):
+        return super().format(copy.deepcopy(original_article), subscriber, codes, encoding)
+
+
+def generate_article(embeds=EMBEDS):
+    now = datetime.datetime.now(datetime.timezone.utc)
+    body = []
+    associations = {}
+    for i in range(embeds):
+        embed_id = "embedded{}".format(i)
+        body.append("<p>paragraph {}</p>".format(i))
+        body.append(
+            '<!-- EMBED START Image {{id: "{id}"}} --><figure><img src="foo.jpg" />'
+            '</figure><!-- EMBED END Image {{id: "{id}"}} -->'.format(id=embed_id)
+        )
+        associations[embed_id] = {
+            "_id": embed_id,
+            "guid": embed_id,
+            "type": "picture",
+            "description_text": "picture {} ".format(i) * 20,
+            "renditions": {
+                name: {
+                    "href": "http://example.com/{}/{}.jpg".format(name, i),
+                    "width": 1400,
+                    "height": 1400,
+                    "poi": {"x": 100, "y": 100},
+                }
+                for name in ("original", "baseImage", "viewImage", "thumbnail", "16-9", "4-3")
+            },
+            "versioncreated": now,
+        }
+    associations["featuremedia"] = associations["embedded0"]
+    return {
+        "_id": "urn:bench",
+        "type": "text",
+        "headline": "benchmark",
+        "slugline": "benchmark",
+        "family_id": "urn:bench",
+        "versioncreated": now,
+        "body_html": "".join(body),
+        "anpa_category": [{"name": "service{}".format(i)} for i in range(SERVICES)],
+        "subject": [{"qcode": "02001003", "parent": "02000000", "scheme": "subject_custom", "name": "foo"}],
+        "associations": associations,
+    }
+
+
+def main():
+    with app_context():
+        article = generate_article()
+        subscribers = [{"_id": i, "name": "subscriber {}".format(i)} for i in range(SUBSCRIBERS)]
+        for label, formatter in (("before", LegacyFormatter()), ("after", NTBNITFMultiFileFormatter())):
+            run(label, lambda subscriber: formatter.format(article, subscriber), subscribers)
+            peak_memory(label, lambda subscriber: formatter.format(article, subscriber), subscribers)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+"""Convert long HTML body to NITF.
+
+Compares paragraph classing using previous sibling with the lookup
+of paragraph index in its parent which was done before.
+"""
+
+from lxml import etree
+
+from ntb.tests.benchmarks import app_context, run
+from ntb.publish.ntb_nitf import NTBNITFFormatter
+from superdesk.publish.formatters.nitf_formatter import EraseElement
+
+PARAGRAPHS = 2000
+ROUNDS = 10
+
+
+class LegacyFormatter(NTBNITFFormatter):
+    def p_filter(self, root_elem, p_elem):
+        if p_elem.get("class") == "ntb-media":
+            raise EraseElement("Element need to be erased")
+        parent = p_elem.find("..")
+        children = list(parent)
+        idx = children.index(p_elem)
+        if (
+            idx > 0
+            and children[idx - 1].tag == "hl2"
+            or p_elem.attrib.get("class", None) == "footer-txt"
+        ):
+            p_elem.attrib["class"] = "txt"
+        else:
+            p_elem.attrib["class"] = "txt-ind"
+
+
+def generate_body(paragraphs=PARAGRAPHS):
+    body = []
+    for i in range(paragraphs):
+        if i % 10 == 0:
+            body.append("<h2>heading {}</h2>".format(i))
+        body.append("<p>paragraph {}</p>".format(i))
+    return "<div>{}</div>".format("".join(body))
+
+
+def main():
+    with app_context():
+        html = generate_body()
+        outputs = []
+        for label, formatter in (("before", LegacyFormatter()), ("after", NTBNITFFormatter())):
+            run(
+                label,
+                lambda _: outputs.append(etree.tostring(formatter.html2nitf(etree.fromstring(html)))),
+                range(ROUNDS),
+            )
+        assert outputs[0] == outputs[-1], "output differs"
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+import flask
+import superdesk
+
+from unittest import TestCase
+from unittest.mock import MagicMock, patch
+
+from ntb import contacts
+from ntb.tests.mock import resources
+
+CONTACT = {"_id": "foo", "first_name": "John", "public": True}
+
+
+class ContactsTestCase(TestCase):
+    def setUp(self):
+        self.app = flask.Flask(__name__)
+        self.app.config.from_object("settings")
+        self.ctx = self.app.app_context()
+        self.ctx.push()
+        contacts.invalidate()
+        self.addCleanup(contacts.invalidate)
+
+    def tearDown(self):
+        self.ctx.pop()
+
+    def mock_find(self, docs):
+        find = MagicMock(return_value=docs)
+        superdesk.resources["contacts"].service.find = find
+        return find
+
+    @patch.dict("superdesk.resources", resources)
+    def test_get_first_public(self):
+        find = self.mock_find([CONTACT])
+        self.assertEqual("John", contacts.get_first_public(["missing", "foo"])["first_name"])
+        self.assertEqual("John", contacts.get_first_public(["foo"])["first_name"])
+        self.assertIsNone(contacts.get_first_public(["missing"]))
+        find.assert_called_once()
+
+    @patch.dict("superdesk.resources", resources)
+    def test_invalidate(self):
+        find = self.mock_find([CONTACT])
+        contacts.preload(["foo"])
+        contacts.invalidate("foo")
+        find.return_value = [dict(CONTACT, public=False)]
+        self.assertIsNone(contacts.get_first_public(["foo"]))
+        self.assertEqual(2, find.call_count)
+
+    @patch.dict("superdesk.resources", resources)
+    def test_ttl(self):
+        self.app.config[contacts.TTL_CONFIG_KEY] = -1
+        find = self.mock_find([CONTACT])
+        contacts.preload(["foo"])
+        contacts.preload(["foo"])
+        self.assertEqual(2, find.call_count)
@@ -0,0 +1,74 @@
+import flask
+import superdesk
+
+from unittest import TestCase
+from unittest.mock import patch
+
+from ntb import content_profiles
+from ntb.publish.ntb_nitf import get_content_field
+from ntb.tests.mock import resources
+
+PROFILE = {
+    "_id": "text",
+    "_etag": "1",
+    "schema": {"headline": {"maxlength": 64}},
+    "editor": {"headline": {"order": 1}},
+}
+
+
+class ContentProfilesTestCase(TestCase):
+    def setUp(self):
+        self.app = flask.Flask(__name__)
+        self.app.config.from_object("settings")
+        self.ctx = self.app.app_context()
+        self.ctx.push()
+        content_profiles.invalidate()
+        self.addCleanup(content_profiles.invalidate)
+
+    def tearDown(self):
+        self.ctx.pop()
+
+    def get_service(self):
+        service = superdesk.get_resource_service("content_types")
+        service.content_types["text"] = dict(PROFILE)
+        return service
+
+    @patch.dict("superdesk.resources", resources)
+    def test_get_schema(self):
+        service = self.get_service()
+        with patch.object(service, "find_one", wraps=service.find_one) as find_one:
+            self.assertEqual(
+                {"maxlength": 64}, get_content_field({"profile": "text"}, "headline")
+            )
+            self.assertIsNone(get_content_field({"profile": "text"}, "body_html"))
+            self.assertEqual({"order": 1}, content_profiles.get_editor("text")["headline"])
+            self.assertEqual(1, find_one.call_count)
+
+    @patch.dict("superdesk.resources", resources)
+    def test_missing_profile(self):
+        self.get_service()
+        self.assertIsNone(content_profiles.get_profile("missing"))
+        self.assertIsNone(get_content_field({"profile": "missing"}, "headline"))
+        self.assertEqual({}, content_profiles.get_editor("missing"))
+
+    @patch.dict("superdesk.resources", resources)
+    def test_invalidate(self):
+        self.get_service()
+        profile = content_profiles.get_profile("text")
+        self.assertIs(profile, content_profiles.get_profile("text"))
+        content_profiles.invalidate("text")
+        self.assertIsNot(profile, content_profiles.get_profile("text"))
+
+    @patch.dict("superdesk.resources", resources)
+    def test_etag_poll(self):
+        self.app.config[content_profiles.TTL_CONFIG_KEY] = 0
+        service = self.get_service()
+        profile = content_profiles.get_profile("text")
+        self.assertIs(profile, content_profiles.get_profile("text"))
+
+        service.content_types["text"] = dict(
+            PROFILE, _etag="2", schema={"headline": {"maxlength": 100}}
+        )
+        self.assertEqual(
+            {"maxlength": 100}, get_content_field({"profile": "text"}, "headline")
+        )
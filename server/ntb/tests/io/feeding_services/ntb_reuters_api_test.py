@@ -0,0 +1,369 @@
+import json
+import time
+import flask
+import datetime
+import requests
+import threading
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import TestCase, mock
+from superdesk import default_settings
+
+from ntb.io.feeding_services import ntb_reuters_api, oauth
+from ntb.io.feeding_services.ntb_reuters_api import NTBReutersHTTPFeedingService
+
+PAGES = [["uri{}".format(i) for i in range(start, start + 10)] for start in (0, 10, 20)]
+
+
+class StubGraphQLServer:
+    """Reuters GraphQL API stub running in a thread.
+
+    :param pages: uris of items returned by search, page by page
+    :param failures: statuses returned for requests of uri before it's returned
+    :param delay: seconds every items request takes
+    :param versions: versions of items by uri
+
+    Requests are only accepted with the last token issued.
+    """
+
+    def __init__(self, pages, failures=None, delay=0, versions=None):
+        self.pages = pages
+        self.versions = versions or {}
+        self.failures = {uri: list(statuses) for uri, statuses in (failures or {}).items()}
+        self.delay = delay
+        self.searches = []
+        self.requests = []
+        self.batches = []
+        self.token = None
+        self.issued_tokens = 0
+        self.rejected_tokens = []
+        self.active = 0
+        self.max_active = 0
+        self.lock = threading.Lock()
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self.url = "http://127.0.0.1:{}/graphql".format(self.server.server_port)
+        self.auth_url = "http://127.0.0.1:{}/token".format(self.server.server_port)
+
+    def __enter__(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def issue_token(self):
+        with self.lock:
+            self.issued_tokens += 1
+            self.token = "token{}".format(self.issued_tokens)
+            return {"access_token": self.token, "expires_in": 3600}
+
+    def is_authorized(self, authorization):
+        with self.lock:
+            if authorization == "Bearer {}".format(self.token):
+                return True
+            self.rejected_tokens.append(authorization)
+            return False
+
+    def search(self, variables):
+        self.searches.append(variables)
+        page = int(variables.get("cursor") or 0)
+        return {
+            "data": {
+                "search": {
+                    "pageInfo": {"hasNextPage": page + 1 < len(self.pages), "endCursor": str(page + 1)},
+                    "items": [
+                        {"uri": uri, "versionCreated": self.versions.get(uri, "2023-03-24T11:05:25.000Z")}
+                        for uri in self.pages[page]
+                    ],
+                }
+            }
+        }
+
+    def items(self, variables):
+        uris = list(variables.values())
+        with self.lock:
+            self.requests.extend(uris)
+            self.batches.append(uris)
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+            statuses = [self.failures[uri].pop(0) for uri in uris if self.failures.get(uri)]
+        time.sleep(self.delay)
+        with self.lock:
+            self.active -= 1
+        data = {
+            alias: {"uri": uri, "type": "text", "headLine": uri} for alias, uri in variables.items()
+        }
+        return statuses[0] if statuses else 200, {"data": data}
+
+    def _handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers["Content-Length"]))
+                status = 200
+                if self.path == "/token":
+                    data = stub.issue_token()
+                elif not stub.is_authorized(self.headers.get("Authorization")):
+                    status, data = 401, {}
+                elif "search(" in json.loads(body)["query"]:
+                    body = json.loads(body)
+                    data = stub.search(body["variables"])
+                else:
+                    status, data = stub.items(json.loads(body)["variables"])
+                payload = json.dumps(data).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+
+class NTBReutersHTTPFeedingServiceTestCase(TestCase):
+    def setUp(self):
+        self.service = NTBReutersHTTPFeedingService()
+        self.service.RETRY_BACKOFF = 0
+        self.service.session = requests.Session()
+        self.parser = mock.Mock()
+        self.parser.parse.side_effect = lambda data, provider: {"guid": data["data"]["item"]["uri"]}
+        patcher = mock.patch.object(ntb_reuters_api, "superdesk")
+        self.providers_service = patcher.start().get_resource_service.return_value
+        self.addCleanup(patcher.stop)
+
+        self.app = flask.Flask(__name__)
+        self.app.cache = None
+        # used to decode cached values
+        self.app.config["DATE_FORMAT"] = default_settings.DATE_FORMAT
+        self.ctx = self.app.app_context()
+        self.ctx.push()
+        self.addCleanup(self.ctx.pop)
+        oauth.clear()
+        self.addCleanup(oauth.clear)
+
+    def get_provider_config(self, stub, **kwargs):
+        config = {
+            "url": stub.url,
+            "auth_url": stub.auth_url,
+            "client_id": "client",
+            "client_secret": "secret",
+            "audience": "audience",
+        }
+        config.update(kwargs)
+        return config
+
+    def get_provider(self, stub, **kwargs):
+        return {"_id": "reuters", "config": self.get_provider_config(stub, **kwargs)}
+
+    def update(self, provider, update=None):
+        with mock.patch.object(self.service, "get_feed_parser", return_value=self.parser):
+            for items in self.service._update(provider, {} if update is None else update):
+                yield [item["guid"] for item in items]
+
+    def fetch_details(self, stub, uris, **kwargs):
+        return self.service._fetch_details(
+            self.get_provider_config(stub, **kwargs), [{"id": uri} for uri in uris]
+        )
+
+    def test_fetch_details_in_parallel(self):
+        uris = ["uri{}".format(i) for i in range(20)]
+        with StubGraphQLServer([uris], delay=0.05) as stub:
+            start = time.perf_counter()
+            data = self.fetch_details(stub, uris, parallelism="5", batch_size="1")
+            elapsed = time.perf_counter() - start
+        self.assertEqual(uris, [item["data"]["item"]["uri"] for item in data])
+        self.assertEqual(5, stub.max_active)
+        self.assertLess(elapsed, 20 * 0.05)
+
+    def test_fetch_details_default_parallelism(self):
+        uris = ["uri{}".format(i) for i in range(10)]
+        with StubGraphQLServer([uris], delay=0.05) as stub:
+            self.fetch_details(stub, uris, batch_size="1")
+        self.assertEqual(self.service.DEFAULT_PARALLELISM, stub.max_active)
+
+    def test_fetch_details_in_batches(self):
+        uris = ["uri{}".format(i) for i in range(25)]
+        with StubGraphQLServer([uris]) as stub:
+            data = self.fetch_details(stub, uris)
+        self.assertEqual(uris, [item["data"]["item"]["uri"] for item in data])
+        # batches are sent in parallel
+        self.assertEqual([5, 10, 10], sorted(len(batch) for batch in stub.batches))
+        self.assertEqual(sorted(uris), sorted(stub.requests))
+
+    def test_fetch_details_missing_item(self):
+        self.service.get_token = mock.Mock(return_value="token")
+        self.service.session.post = mock.Mock()
+        self.service.session.post.return_value.status_code = 200
+        self.service.session.post.return_value.json.return_value = {
+            "data": {"i0": None, "i1": {"uri": "bar"}},
+            "errors": [{"message": "not found", "path": ["i0"]}],
+        }
+        data = self.service._fetch_details({"url": "foo"}, [{"id": "foo"}, {"id": "bar"}])
+        self.assertEqual([{"data": {"item": None}}, {"data": {"item": {"uri": "bar"}}}], data)
+
+    def test_detailed_query(self):
+        query, variables = self.service.get_detailed_query([{"id": "foo"}, {"id": "bar"}])
+        self.assertIn("query MyQuery($i0: ID!, $i1: ID!)", query)
+        self.assertIn("i0: item(id: $i0)", query)
+        self.assertIn("i1: item(id: $i1)", query)
+        self.assertEqual({"i0": "foo", "i1": "bar"}, variables)
+
+    def test_fetch_details_retry(self):
+        with StubGraphQLServer([["foo", "bar"]], failures={"foo": [503, 429]}) as stub:
+            data = self.fetch_details(stub, ["foo", "bar"], batch_size="1")
+        self.assertEqual(["foo", "bar"], [item["data"]["item"]["uri"] for item in data])
+        self.assertEqual(3, stub.requests.count("foo"))
+        self.assertEqual(1, stub.requests.count("bar"))
+
+    def test_fetch_details_retry_exhausted(self):
+        failures = {"foo": [500] * (self.service.MAX_RETRIES + 1)}
+        with StubGraphQLServer([["foo"]], failures=failures) as stub:
+            with self.assertRaises(requests.exceptions.HTTPError):
+                self.fetch_details(stub, ["foo"])
+        self.assertEqual(self.service.MAX_RETRIES + 1, len(stub.requests))
+
+    def test_fetch_details_not_retried(self):
+        with StubGraphQLServer([["foo"]], failures={"foo": [400]}) as stub:
+            with self.assertRaises(requests.exceptions.HTTPError):
+                self.fetch_details(stub, ["foo"])
+        self.assertEqual(1, len(stub.requests))
+
+    def test_retry_after(self):
+        response = requests.Response()
+        response.headers["Retry-After"] = "7"
+        self.assertEqual(7, self.service.get_retry_delay(response, 0))
+        self.service.RETRY_BACKOFF = 1
+        self.assertEqual(4, self.service.get_retry_delay(requests.Response(), 2))
+
+    def test_update(self):
+        update = {}
+        with StubGraphQLServer(PAGES, failures={"uri15": [502]}) as stub:
+            provider = self.get_provider(stub, parallelism="3", batch_size="4")
+            items = list(self.update(provider, update))
+        self.assertEqual(PAGES, items)
+        # 3 requests for every page, one of them retried
+        self.assertEqual(10, len(stub.batches))
+        # cursor of next page is saved when page is ingested
+        self.assertEqual(
+            ["1", "2"],
+            [
+                call[0][1]["private"]["search"]["cursor"]
+                for call in self.providers_service.system_update.call_args_list
+            ],
+        )
+        self.assertEqual({}, update["private"]["search"])
+
+    def test_update_yields_pages(self):
+        with StubGraphQLServer(PAGES) as stub:
+            items = self.update(self.get_provider(stub))
+            self.assertEqual(PAGES[0], next(items))
+            self.assertEqual(PAGES[0], stub.requests)
+            self.providers_service.system_update.assert_not_called()
+            self.assertEqual(PAGES[1], next(items))
+            self.providers_service.system_update.assert_called_once()
+
+    def test_update_resume(self):
+        with StubGraphQLServer(PAGES, failures={"uri15": [400]}) as stub:
+            provider = self.get_provider(stub)
+            provider["last_updated"] = datetime.datetime(2023, 3, 24, 11, 5, 25)
+            update = {}
+            self.assertEqual(PAGES[:1], list(self.update(provider, update)))
+            self.assertNotIn("private", update)
+            self.assertEqual({"cursor": "1", "date_range": "2023.03.24.11.05.25"}, provider["private"]["search"])
+
+            # next update continues from failed page with same date range
+            provider["last_updated"] = datetime.datetime(2023, 3, 24, 12, 0, 0)
+            self.assertEqual(PAGES[1:], list(self.update(provider, update)))
+            self.assertEqual({"cursor": "1", "dateRange": "2023.03.24.11.05.25"}, stub.searches[2])
+            self.assertEqual({}, update["private"]["search"])
+
+    def test_update_skips_seen_items(self):
+        with StubGraphQLServer(PAGES) as stub:
+            provider = self.get_provider(stub)
+            update = {}
+            self.assertEqual(PAGES, list(self.update(provider, update)))
+            self.assertEqual(30, len(update["private"]["seen"]))
+
+            provider["private"] = update["private"]
+            stub.requests.clear()
+            self.assertEqual([], list(self.update(provider, update)))
+            self.assertEqual([], stub.requests)
+
+            provider["private"] = update["private"]
+            stub.versions["uri12"] = "2023-03-24T12:00:00.000Z"
+            self.assertEqual([["uri12"]], list(self.update(provider, update)))
+            self.assertEqual(["uri12"], stub.requests)
+            self.assertEqual(
+                "2023-03-24T12:00:00.000Z",
+                next(entry["version"] for entry in update["private"]["seen"] if entry["uri"] == "uri12"),
+            )
+
+    def test_update_failed_items_not_seen(self):
+        with StubGraphQLServer(PAGES[:1]) as stub:
+            provider = self.get_provider(stub)
+            update = {}
+            with mock.patch.object(self.service, "get_feed_parser", return_value=self.parser):
+                items = self.service._update(provider, update)
+                next(items)
+                with self.assertRaises(StopIteration):
+                    items.send({"uri3"})
+        seen = [entry["uri"] for entry in update["private"]["seen"]]
+        self.assertEqual(9, len(seen))
+        self.assertNotIn("uri3", seen)
+
+    def test_seen_expired(self):
+        now = int(time.time())
+        provider = {
+            "private": {
+                "seen": [
+                    {"uri": "foo", "version": "1", "seen_at": now},
+                    {"uri": "bar", "version": "1", "seen_at": now - self.service.SEEN_TTL.total_seconds() - 1},
+                ],
+            },
+        }
+        seen = self.service._get_seen(provider)
+        self.assertEqual(["foo"], list(seen))
+        self.assertTrue(self.service._is_seen(seen, {"id": "foo", "version": "1"}))
+        self.assertFalse(self.service._is_seen(seen, {"id": "foo", "version": "2"}))
+        self.assertFalse(self.service._is_seen(seen, {"id": "bar", "version": "1"}))
+
+    def test_seen_capped(self):
+        now = int(time.time())
+        seen = {
+            "foo": {"uri": "foo", "version": "1", "seen_at": now - 2},
+            "bar": {"uri": "bar", "version": "1", "seen_at": now},
+            "baz": {"uri": "baz", "version": "1", "seen_at": now - 1},
+        }
+        with mock.patch.object(self.service, "MAX_SEEN", 2):
+            private = self.service._get_private({}, {}, seen)
+        self.assertEqual(["bar", "baz"], [entry["uri"] for entry in private["seen"]])
+
+    def test_token_shared(self):
+        with StubGraphQLServer(PAGES) as stub:
+            self.assertEqual(PAGES, list(self.update(self.get_provider(stub, parallelism="3", batch_size="4"))))
+            self.assertEqual(PAGES, list(self.update(self.get_provider(stub))))
+        self.assertEqual(1, stub.issued_tokens)
+        self.providers_service.update.assert_not_called()
+
+    def test_token_rejected(self):
+        with StubGraphQLServer(PAGES) as stub:
+            self.assertEqual(PAGES, list(self.update(self.get_provider(stub))))
+            # token was revoked, new one is fetched and request is sent again
+            stub.token = "revoked"
+            stub.requests.clear()
+            self.assertEqual(PAGES, list(self.update(self.get_provider(stub))))
+        self.assertEqual(["Bearer token1"], stub.rejected_tokens)
+        self.assertEqual(2, stub.issued_tokens)
+        self.assertEqual(30, len(stub.requests))
+
+    def test_token_rejected_again(self):
+        with StubGraphQLServer(PAGES) as stub:
+            with mock.patch.object(stub, "is_authorized", return_value=False):
+                self.assertEqual([], list(self.update(self.get_provider(stub))))
+        # only retried once
+        self.assertEqual(2, stub.issued_tokens)
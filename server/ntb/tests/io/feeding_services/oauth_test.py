@@ -0,0 +1,117 @@
+import time
+import flask
+import requests
+import threading
+
+from unittest import TestCase, mock
+from concurrent.futures import ThreadPoolExecutor
+
+from superdesk import default_settings
+from superdesk.errors import IngestApiError
+
+from ntb.io.feeding_services import oauth
+
+AUTH_URL = "https://auth.example.com/oauth/token"
+
+
+class OAuthTokensTestCase(TestCase):
+    def setUp(self):
+        self.app = flask.Flask(__name__)
+        self.app.cache = None
+        # used to decode cached values
+        self.app.config["DATE_FORMAT"] = default_settings.DATE_FORMAT
+        self.ctx = self.app.app_context()
+        self.ctx.push()
+        self.addCleanup(self.ctx.pop)
+        oauth.clear()
+        self.addCleanup(oauth.clear)
+        # cache backend is created on first use, not thread safe
+        oauth.cache.backend.clean()
+
+        self.fetched = 0
+        self.fetch_lock = threading.Lock()
+        patcher = mock.patch.object(oauth.requests, "post", side_effect=self.post)
+        self.post_mock = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def post(self, url, data, timeout):
+        with self.fetch_lock:
+            self.fetched += 1
+            access_token = "token{}".format(self.fetched)
+        response = mock.Mock(status_code=200)
+        response.json.return_value = {"access_token": access_token, "expires_in": 3600}
+        return response
+
+    def get_token(self, client_id="client"):
+        return oauth.get_token(AUTH_URL, client_id, "secret", "audience")
+
+    def test_get_token(self):
+        self.assertEqual("token1", self.get_token())
+        self.assertEqual("token1", self.get_token())
+        self.assertEqual(1, self.fetched)
+        self.post_mock.assert_called_once_with(
+            AUTH_URL,
+            data={
+                "client_id": "client",
+                "client_secret": "secret",
+                "grant_type": "client_credentials",
+                "audience": "audience",
+            },
+            timeout=oauth.HTTP_TIMEOUT,
+        )
+
+        self.assertEqual("token2", self.get_token("other"))
+
+    def test_shared_between_workers(self):
+        self.assertEqual("token1", self.get_token())
+        # other worker has nothing in process
+        oauth.clear()
+        self.assertEqual("token1", self.get_token())
+        self.assertEqual(1, self.fetched)
+
+    def test_refresh_before_expiry(self):
+        now = time.time()
+        self.assertEqual("token1", self.get_token())
+        with mock.patch.object(oauth.time, "time", return_value=now + 3600 - oauth.REFRESH_BEFORE + 1):
+            self.assertEqual("token2", self.get_token())
+            self.assertEqual("token2", self.get_token())
+        self.assertEqual(2, self.fetched)
+
+    def test_refreshed_by_other_worker(self):
+        now = time.time()
+        self.assertEqual("token1", self.get_token())
+        lock = mock.Mock()
+        lock.acquire.return_value = False
+        with mock.patch.object(oauth.time, "time", return_value=now + 3600 - oauth.REFRESH_BEFORE + 1):
+            with mock.patch.object(oauth.cache.backend, "lock", return_value=lock):
+                # current token is used while other worker refreshes it
+                self.assertEqual("token1", self.get_token())
+        lock.acquire.assert_called_once_with(wait=False)
+        self.assertEqual(1, self.fetched)
+
+    def test_single_flight(self):
+        def get_token(_):
+            with self.app.app_context():
+                return self.get_token()
+
+        with ThreadPoolExecutor(max_workers=10) as executor:
+            tokens = list(executor.map(get_token, range(50)))
+        self.assertEqual(["token1"] * 50, tokens)
+        self.assertEqual(1, self.fetched)
+
+    def test_invalidate(self):
+        self.assertEqual("token1", self.get_token())
+        oauth.invalidate(AUTH_URL, "client", "audience", "token1")
+        self.assertEqual("token2", self.get_token())
+        # token was refreshed already by other request
+        oauth.invalidate(AUTH_URL, "client", "audience", "token1")
+        self.assertEqual("token2", self.get_token())
+        self.assertEqual(2, self.fetched)
+
+    def test_auth_error(self):
+        response = requests.Response()
+        response.status_code = 401
+        self.post_mock.side_effect = None
+        self.post_mock.return_value = response
+        with self.assertRaises(IngestApiError):
+            self.get_token()
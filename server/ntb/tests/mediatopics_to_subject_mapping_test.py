@@ -7,8 +7,9 @@ from unittest import TestCase
 from unittest.mock import patch
 from ntb.publish.ntb_nitf import NTBNITFFormatter
 
+from ntb import vocabularies
 from ntb.tests.mock import resources
-from ntb.mediatopics_to_subject_mapping import populate_subject
+from ntb.mediatopics_to_subject_mapping import populate_subject, topics_mapping
 
 
 class MediatopicsToSubjectMappingTestCase(TestCase):
@@ -59,6 +60,7 @@ class MediatopicsToSubjectMappingTestCase(TestCase):
         self.app.config.from_object("settings")
         self.ctx = self.app.app_context()
         self.ctx.push()
+        topics_mapping.clear()
         return super().setUp()
 
     def tearDown(self) -> None:
@@ -137,3 +139,26 @@ class MediatopicsToSubjectMappingTestCase(TestCase):
         print(json.dumps(item["subject"], indent=2))
         sports = [subj for subj in item["subject"] if subj["name"].lower() == "sport"]
         self.assertEqual(2, len(sports))
+
+    @patch.dict("superdesk.resources", resources)
+    def test_mapping_index_rebuild(self, *mocks):
+        with patch(
+            "ntb.mediatopics_to_subject_mapping._get_topics_mapping",
+            return_value={"20000550": {"qcode": "10004000", "scheme": ntb.SUBJECTCODES_CV}},
+        ) as build_mock:
+            for i in range(3):
+                item = copy.deepcopy(self.item)
+                populate_subject(None, item)
+                self.assertEqual(5, len(item["subject"]))
+            self.assertEqual(1, build_mock.call_count)
+
+            vocabularies.invalidate(ntb.SUBJECTCODES_CV)
+            populate_subject(None, copy.deepcopy(self.item))
+            self.assertEqual(2, build_mock.call_count)
+
+    @patch.dict("superdesk.resources", resources)
+    def test_mapping_no_duplicates(self, *mocks):
+        item = copy.deepcopy(self.item)
+        populate_subject(None, item)
+        populate_subject(None, item)
+        self.assertEqual(7, len(item["subject"]))
@@ -6,7 +6,7 @@ from flask import current_app as app
 from unittest.mock import create_autospec
 from superdesk.vocabularies import VocabulariesService
 from superdesk.publish.subscribers import SubscribersService
-from superdesk.publish.publish_queue import PublishQueueService
+from superdesk.sequences import SequencesService
 
 
 class MockResource:
@@ -31,16 +31,19 @@ class MockVocabulariesService(VocabulariesService):
         return []
 
 
+class MockContentTypesService:
+    def __init__(self):
+        self.content_types = {}
+
+    def find_one(self, req=None, _id=None):
+        return self.content_types.get(_id)
+
+
 class MockSubscribersService(SubscribersService):
     def generate_sequence_number(self, subscriber):
         return 1
 
 
-class MockCursor:
-    def count(self):
-        return 0
-
-
 class MockData:
     def __init__(self):
         self.storage = {}
@@ -71,14 +74,16 @@ class MockDataService:
 
 class MockResources:
     def __iter__(self):
-        publish_queue = create_autospec(PublishQueueService)
-        publish_queue.find.return_value = MockCursor()
+        sequences = create_autospec(SequencesService)
+        sequences.get_next_sequence_number.return_value = 1
         _resources = {
+            "archive": MockResource(MockDataService("archive")),
             "events": MockResource(MockDataService("events")),
             "contacts": MockResource(MockDataService("contacts")),
+            "content_types": MockResource(MockContentTypesService()),
             "subscribers": MockResource(MockSubscribersService()),
             "vocabularies": MockResource(MockVocabulariesService()),
-            "publish_queue": MockResource(publish_queue),
+            "sequences": MockResource(sequences),
         }
         return iter(list(_resources.items()))
 
@@ -0,0 +1,79 @@
+import copy
+import flask
+
+from unittest import mock, TestCase
+from ntb.publish import batch
+from ntb.publish.ntb_nitf_multifile import NTBNITFMultiFileFormatter
+from ntb.tests.mock import resources
+from ntb.tests.publish.ntb_nitf_test import ARTICLE
+
+
+class FakeSequencesService:
+    def __init__(self, value=0):
+        self.value = value
+        self.calls = 0
+
+    def find_and_modify(self, query, update, upsert=False, new=False):
+        self.calls += 1
+        if "$inc" in update:
+            self.value += update["$inc"]["sequence_number"]
+        else:
+            self.value = update["$set"]["sequence_number"]
+        return {"key": query["key"], "sequence_number": self.value}
+
+
+class BatchFormatTestCase(TestCase):
+    def setUp(self):
+        self.app = flask.Flask(__name__)
+        self.app.config.update(
+            {"DEFAULT_TIMEZONE": "Europe/Oslo", "MAX_VALUE_OF_PUBLISH_SEQUENCE": 100}
+        )
+        self.ctx = self.app.app_context()
+        self.ctx.push()
+
+    def tearDown(self):
+        self.ctx.pop()
+
+    def test_reserve_sequence_numbers(self):
+        sequences = FakeSequencesService(value=5)
+        with mock.patch.object(batch, "get_resource_service", return_value=sequences):
+            self.assertEqual([6, 7, 8], batch.reserve_sequence_numbers({"_id": "foo"}, 3))
+            self.assertEqual(1, sequences.calls)
+            self.assertEqual([], batch.reserve_sequence_numbers({"_id": "foo"}, 0))
+            self.assertEqual(1, sequences.calls)
+
+    def test_reserve_sequence_numbers_restart(self):
+        sequences = FakeSequencesService(value=8)
+        subscriber = {"_id": "foo", "sequence_num_settings": {"min": 1, "max": 10}}
+        with mock.patch.object(batch, "get_resource_service", return_value=sequences):
+            self.assertEqual(
+                [9, 10, 1, 2], batch.reserve_sequence_numbers(subscriber, 4)
+            )
+            self.assertEqual(2, sequences.value)
+
+    @mock.patch.dict("superdesk.resources", resources)
+    def test_format_many(self):
+        formatter = NTBNITFMultiFileFormatter()
+        articles = []
+        for i in range(3):
+            article = copy.deepcopy(ARTICLE)
+            article["_id"] = article["guid"] = "urn:batch:{}".format(i)
+            article["anpa_category"] = [{"name": "service1"}, {"name": "service2"}]
+            articles.append(article)
+
+        with mock.patch.object(
+            batch, "reserve_sequence_numbers", return_value=list(range(10, 16))
+        ) as reserve:
+            outputs = list(formatter.format_many(articles, {"_id": "foo"}))
+        reserve.assert_called_once_with({"_id": "foo"}, 6)
+
+        self.assertEqual(3, len(outputs))
+        self.assertEqual(
+            list(range(10, 16)),
+            [doc["published_seq_num"] for docs in outputs for doc in docs],
+        )
+        single = formatter.format(articles[0], {"_id": "foo"})
+        self.assertEqual(
+            [doc["encoded_item"] for doc in single],
+            [doc["encoded_item"] for doc in outputs[0]],
+        )
@@ -0,0 +1,52 @@
+import flask
+import threading
+
+from lxml import etree
+from unittest import TestCase
+from ntb.publish import body
+
+# body, char count, word count
+BODIES = [
+    ("<p>foo <b>bar</b> <i>baz</i></p>\n<p>  </p><p>1 000 kr</p>", 21, 5),
+    ("<p>a<br>b<br>c</p>\n<ul>\n<li> x </li>\n</ul>", 6, 2),
+    ("<h2> Title </h2>\n<table>\n<tr>\n<td>1</td>\n<td> </td></tr></table>", 9, 2),
+    ("<p>&lt;tag&gt; &amp; æøå</p>", 11, 2),
+    ("<em>æøå foo æøå <li></li>\n<h2></h2></em><em></em><p></p>", 12, 3),
+]
+
+
+class BodyPipelineTestCase(TestCase):
+    def setUp(self):
+        self.app = flask.Flask(__name__)
+        self.app.config.from_object("settings")
+        self.ctx = self.app.app_context()
+        self.ctx.push()
+
+    def tearDown(self):
+        self.ctx.pop()
+
+    def test_char_count(self):
+        root, _ = body.pipeline.parse_xml(
+            {"body_html": "<p>foo <b>bar</b></p>\n<!-- comment --><p>baz\nqux</p>"}
+        )
+        text = etree.tostring(root, encoding="unicode", method="text")
+        self.assertEqual(len(text.replace("\n", "")), body.get_char_count(root))
+        self.assertEqual(13, body.get_char_count(root))
+
+    def test_parser_per_thread(self):
+        parsers = []
+        thread = threading.Thread(target=lambda: parsers.append(body.pipeline.xml_parser))
+        thread.start()
+        thread.join()
+        self.assertIs(body.pipeline.xml_parser, body.pipeline.xml_parser)
+        self.assertIsNot(parsers[0], body.pipeline.xml_parser)
+
+    def test_analyse_html(self):
+        for html, char_count, word_count in BODIES:
+            analysis = body.pipeline.analyse_html({"body_html": html})
+            self.assertEqual(char_count, analysis.char_count, html)
+            self.assertEqual(word_count, analysis.word_count, html)
+
+    def test_text_word_count(self):
+        self.assertEqual(0, body.get_text_word_count(" \n "))
+        self.assertEqual(4, body.get_text_word_count("foo\nbar, 1 000 000 kr."))
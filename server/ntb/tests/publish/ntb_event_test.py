@@ -2,15 +2,21 @@ import lxml
 import flask
 import superdesk
 
+from ntb import contacts
 from ntb.tests.mock import MockData, resources
 from unittest import mock, TestCase
 from unittest.mock import MagicMock
 from planning.common import POST_STATE, WORKFLOW_STATE
-from ntb.publish.ntb_event import NTBEventFormatter
+from ntb.publish.ntb_event import NTBEventFormatter, rescheduled_ids
 
 
-def mock_contacts_find_one(return_value):
-    superdesk.resources["contacts"].service.find_one = MagicMock(return_value=return_value)
+CONTACT_ID = '5b7a8228f7ab23b336d7f84d'
+
+
+def mock_contacts_find(return_value):
+    contact = dict(return_value, _id=CONTACT_ID, public=True)
+    superdesk.resources["contacts"].service.find = MagicMock(return_value=[contact])
+    return superdesk.resources["contacts"].service.find
 
 
 class NTBEventTestCase(TestCase):
@@ -18,6 +24,9 @@ class NTBEventTestCase(TestCase):
     @mock.patch.dict("superdesk.resources", resources)
     def setUp(self):
         super(NTBEventTestCase, self).setUp()
+        rescheduled_ids.clear()
+        contacts.invalidate()
+        self.addCleanup(contacts.invalidate)
 
         self.app = flask.Flask(__name__)
         self.app.data = MockData()
@@ -295,7 +304,7 @@ class NTBEventTestCase(TestCase):
 
     @mock.patch.dict("superdesk.resources", resources)
     def test_contactname_included(self):
-        mock_contacts_find_one({
+        mock_contacts_find({
             'first_name': 'John',
             'last_name': 'Smith',
             'organisation': 'NASA',
@@ -325,7 +334,7 @@ class NTBEventTestCase(TestCase):
 
     @mock.patch.dict("superdesk.resources", resources)
     def test_contactname_format_no_organisation(self):
-        mock_contacts_find_one({
+        mock_contacts_find({
             'first_name': 'John',
             'last_name': 'Smith',
         })
@@ -344,7 +353,7 @@ class NTBEventTestCase(TestCase):
 
     @mock.patch.dict("superdesk.resources", resources)
     def test_contactname_format_organisation(self):
-        mock_contacts_find_one({
+        mock_contacts_find({
             'first_name': 'John',
             'last_name': 'Smith',
             'organisation': 'NASA',
@@ -364,7 +373,7 @@ class NTBEventTestCase(TestCase):
 
     @mock.patch.dict("superdesk.resources", resources)
     def test_contactname_format_no_firstname(self):
-        mock_contacts_find_one({
+        mock_contacts_find({
             'last_name': 'Smith',
             'organisation': 'NASA',
         })
@@ -383,7 +392,7 @@ class NTBEventTestCase(TestCase):
 
     @mock.patch.dict("superdesk.resources", resources)
     def test_contactname_format_no_lastname(self):
-        mock_contacts_find_one({
+        mock_contacts_find({
             'first_name': 'John',
             'organisation': 'NASA',
         })
@@ -402,7 +411,7 @@ class NTBEventTestCase(TestCase):
 
     @mock.patch.dict("superdesk.resources", resources)
     def test_contactname_format_no_names(self):
-        mock_contacts_find_one({
+        mock_contacts_find({
             'organisation': 'NASA',
         })
 
@@ -418,11 +427,55 @@ class NTBEventTestCase(TestCase):
 
         self.assertEqual(contactname.text, 'NASA')
 
-    @mock.patch('apps.contacts.service.ContactsService.find_one', return_value={
-        'contact_email': ['john.smith@nasa.org']
-    })
     @mock.patch.dict("superdesk.resources", resources)
-    def test_contactmail_included(self, magic_mock, **kwargs):
+    def test_contact_first_public(self):
+        superdesk.resources["contacts"].service.find = MagicMock(return_value=[
+            {'_id': CONTACT_ID, 'first_name': 'Private', 'public': False},
+            {'_id': '7ab23b336d7f84d5b7a8228f', 'first_name': 'Public', 'public': True},
+        ])
+
+        self.item['event_contact_info'] = [
+            '5b7a8228f7ab23b336d7f84d',
+            '7ab23b336d7f84d5b7a8228f',
+        ]
+
+        formatter = NTBEventFormatter()
+        output = formatter.format(self.item, {})[0]
+        root = lxml.etree.fromstring(output['encoded_item'])
+        self.assertEqual('Public', root.find('contactname').text)
+
+    @mock.patch.dict("superdesk.resources", resources)
+    def test_contacts_cached(self):
+        find = mock_contacts_find({'first_name': 'John'})
+        items = []
+        for i in range(5):
+            item = self.item.copy()
+            item['_id'] = 'event-{}'.format(i)
+            item['event_contact_info'] = [CONTACT_ID, 'contact-{}'.format(i % 2)]
+            items.append(item)
+
+        formatter = NTBEventFormatter()
+        outputs = list(formatter.format_many(items, {'_id': 'foo'}))
+        self.assertEqual(5, len(outputs))
+        find.assert_called_once()
+        self.assertEqual(
+            {'_id': {'$in': [CONTACT_ID, 'contact-0', 'contact-1']}},
+            find.call_args[0][0],
+        )
+
+        formatter.format(items[0], {})
+        find.assert_called_once()
+
+        for output in outputs:
+            root = lxml.etree.fromstring(output[0]['encoded_item'])
+            self.assertEqual('John', root.find('contactname').text)
+
+    @mock.patch.dict("superdesk.resources", resources)
+    def test_contactmail_included(self):
+        mock_contacts_find({
+            'contact_email': ['john.smith@nasa.org']
+        })
+
         self.item['event_contact_info'] = [
             '5b7a8228f7ab23b336d7f84d',
             '7ab23b336d7f84d5b7a8228f',
@@ -439,7 +492,7 @@ class NTBEventTestCase(TestCase):
 
     @mock.patch.dict("superdesk.resources", resources)
     def test_contactmail_not_included(self):
-        mock_contacts_find_one({
+        mock_contacts_find({
             'contact_email': []
         })
 
@@ -459,7 +512,7 @@ class NTBEventTestCase(TestCase):
 
     @mock.patch.dict("superdesk.resources", resources)
     def test_contactphone_included(self):
-        mock_contacts_find_one({
+        mock_contacts_find({
             'contact_phone': [{'number': '99999', 'public': True}]
         })
 
@@ -479,7 +532,7 @@ class NTBEventTestCase(TestCase):
 
     @mock.patch.dict("superdesk.resources", resources)
     def test_contactphone_not_included(self):
-        mock_contacts_find_one({
+        mock_contacts_find({
             'contact_phone': [{'number': '99999', 'public': False}]
         })
 
@@ -547,6 +600,34 @@ class NTBEventTestCase(TestCase):
         root = lxml.etree.fromstring(output['encoded_item'])
         self.assertEqual('NBRP161031_092725_hh_00', root.find('ntbId').text)
 
+    @mock.patch.dict("superdesk.resources", resources)
+    def test_ntb_id_reschedule_chain(self):
+        events = {'event-0': self.item.copy()}
+        for i in range(1, 52):
+            event = self.item_rescheduled.copy()
+            event['_id'] = 'event-{}'.format(i)
+            event['firstcreated'] = '2018-10-25T08:00:00+0000'
+            event['reschedule_from'] = 'event-{}'.format(i - 1)
+            events[event['_id']] = event
+        find_one = superdesk.resources['events'].service.find_one = MagicMock(
+            side_effect=lambda req, _id: events.get(_id)
+        )
+
+        formatter = NTBEventFormatter()
+        output = formatter.format(events['event-50'], {})[0]
+        root = lxml.etree.fromstring(output['encoded_item'])
+        self.assertEqual('NBRP161031_092725_hh_00', root.find('ntbId').text)
+        self.assertEqual(50, find_one.call_count)
+
+        # republished event and event rescheduled again don't walk the chain
+        find_one.reset_mock()
+        output = formatter.format(events['event-50'], {})[0]
+        self.assertEqual(0, find_one.call_count)
+        output = formatter.format(events['event-51'], {})[0]
+        root = lxml.etree.fromstring(output['encoded_item'])
+        self.assertEqual('NBRP161031_092725_hh_00', root.find('ntbId').text)
+        self.assertEqual(1, find_one.call_count)
+
     def test_ntb_id_ingested_rescheduled(self):
         formatter = NTBEventFormatter()
         item = self.item_ingested_rescheduled.copy()
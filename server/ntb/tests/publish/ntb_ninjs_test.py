@@ -2,7 +2,8 @@ import pathlib
 
 from flask import json
 from unittest import mock
-from ntb.publish.ntb_ninjs import NTBNINJSFormatter
+from ntb.publish import planning_ids
+from ntb.publish.ntb_ninjs import NINJS_V2_PROPERTIES, NTBNINJSFormatter, json_encoder
 from superdesk.tests import TestCase
 from datetime import datetime
 from .ntb_nitf_test import TEST_BODY
@@ -250,6 +251,7 @@ class Ninjs2FormatterTest(TestCase):
 
     def setUp(self):
         super().setUp()
+        planning_ids.resolver.clear()
         self.formatter = NTBNINJSFormatter()
         with open(
             pathlib.Path(__file__).parent.parent.parent.parent.joinpath(
@@ -437,10 +439,91 @@ class Ninjs2FormatterTest(TestCase):
             ninjs["altids"],
         )
 
+    def test_planning_ids_batch(self):
+        self.app.data.insert(
+            "assignments",
+            [
+                {"_id": "assignment-{}".format(i), "planning_item": "planning-{}".format(i)}
+                for i in range(3)
+            ],
+        )
+        self.app.data.insert(
+            "planning",
+            [
+                {"_id": "planning-0", "event_item": "event-0"},
+                {"_id": "planning-1"},
+            ],
+        )
+        articles = [
+            dict(self.article, assignment_id="assignment-{}".format(i))
+            for i in range(4)
+        ]
+
+        with mock.patch(
+            "ntb.publish.planning_ids.get_resource_service",
+            wraps=planning_ids.get_resource_service,
+        ) as get_service:
+            outputs = list(self.formatter.format_many(articles, {"_id": "foo"}))
+            self.assertEqual(2, get_service.call_count)
+
+            # resolved ids are cached
+            self.formatter.format(articles[0], {"_id": "foo"})
+            self.assertEqual(2, get_service.call_count)
+
+            # planning without event might be linked later
+            self.formatter.format(articles[1], {"_id": "foo"})
+            self.assertEqual(4, get_service.call_count)
+
+            planning_ids._on_assignment_updated({}, {"_id": "assignment-0"})
+            self.formatter.format(articles[0], {"_id": "foo"})
+            self.assertEqual(6, get_service.call_count)
+
+        altids = [json.loads(output[0][1])["altids"] for output in outputs]
+        self.assertIn({"role": "PLANNING-ID", "value": "planning-0"}, altids[0])
+        self.assertIn({"role": "EVENT-ID", "value": "event-0"}, altids[0])
+        self.assertIn({"role": "PLANNING-ID", "value": "planning-1"}, altids[1])
+        self.assertNotIn("EVENT-ID", [altid["role"] for altid in altids[1]])
+        self.assertIn({"role": "PLANNING-ID", "value": "planning-2"}, altids[2])
+        self.assertNotIn("PLANNING-ID", [altid["role"] for altid in altids[3]])
+
     def test_empty_assocations_renditions(self):
         ninjs = self.format({"associations": {"foo": None}})
         assert "associations" not in ninjs, ninjs.get("associations")
 
+    def test_iter_encode(self):
+        ninjs = self.formatter._transform_to_ninjs(
+            self.article.copy(), {"name": "Test Subscriber"}
+        )
+        chunks = list(
+            self.formatter.iter_encode(self.article.copy(), {"name": "Test Subscriber"})
+        )
+        self.assertGreater(len(chunks), 1)
+        self.assertEqual(json_encoder.encode(ninjs), "".join(chunks))
+
+        ninjs = self.formatter._transform_to_ninjs({"guid": "foo", "type": "text"}, {})
+        self.assertNotIn("associations", ninjs)
+        self.assertEqual(
+            json_encoder.encode(ninjs),
+            "".join(self.formatter.iter_encode({"guid": "foo", "type": "text"}, {})),
+        )
+
+    def test_v2_projection(self):
+        with mock.patch(
+            "superdesk.text_utils.get_reading_time"
+        ) as get_reading_time, mock.patch.object(
+            self.formatter, "_get_renditions"
+        ) as get_renditions:
+            ninjs = self.format()
+        get_reading_time.assert_not_called()
+        get_renditions.assert_not_called()
+        self.assertLessEqual(
+            set(ninjs), set(NINJS_V2_PROPERTIES) | {"associations"}
+        )
+        for item in ninjs["associations"]:
+            self.assertLessEqual(
+                set(item), set(NINJS_V2_PROPERTIES) | {"name", "associations"}
+            )
+
     def test_publish_table(self):
         ninjs = self.format(
             {
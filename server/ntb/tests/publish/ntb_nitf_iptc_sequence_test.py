@@ -0,0 +1,34 @@
+import datetime
+
+from unittest import mock
+from concurrent.futures import ThreadPoolExecutor
+from superdesk.tests import TestCase
+from ntb.publish.ntb_nitf import NTBNITFFormatter
+
+
+class IPTCSequenceTest(TestCase):
+    def setUp(self):
+        super().setUp()
+        self.app.config["DEFAULT_TIMEZONE"] = "Europe/Oslo"
+        self.formatter = NTBNITFFormatter()
+
+    def get_daily_count(self, *args):
+        with self.app.app_context():
+            return self.formatter._get_daily_count()
+
+    def test_parallel_formatters(self):
+        with ThreadPoolExecutor(max_workers=10) as executor:
+            counts = list(executor.map(self.get_daily_count, range(200)))
+        self.assertEqual(len(counts), len(set(counts)), "duplicate sequence numbers")
+        self.assertEqual(list(range(1, 201)), sorted(counts))
+
+    def test_reset_at_local_midnight(self):
+        # 22:30 UTC is 23:30 in Oslo during winter
+        before_midnight = datetime.datetime(2020, 1, 1, 22, 30, tzinfo=datetime.timezone.utc)
+        with mock.patch("ntb.publish.ntb_nitf.utcnow", return_value=before_midnight):
+            self.assertEqual(1, self.get_daily_count())
+            self.assertEqual(2, self.get_daily_count())
+
+        after_midnight = before_midnight + datetime.timedelta(hours=1)
+        with mock.patch("ntb.publish.ntb_nitf.utcnow", return_value=after_midnight):
+            self.assertEqual(1, self.get_daily_count())
@@ -18,7 +18,7 @@ from lxml import etree
 from unittest import mock, TestCase
 from ntb.tests.mock import resources
 from ntb.publish.ntb_nitf import NTBNITFFormatter
-from ntb.publish.ntb_nitf import ENCODING
+from ntb.publish.ntb_nitf import ENCODING, render_cache
 from superdesk.publish.formatters import Formatter
 
 TEST_ABSTRACT = "This is the abstract"
@@ -741,6 +741,7 @@ class NTBNITFFormatterTest(TestCase):
             filename.get("content"),
             datetime + "__Forskning_ny1-this-is-the-slugline-----.xml",
         )
+        self.assertEqual(filename.get("content"), self.formatter_output[0]["filename"])
 
     def test_encoding(self):
         encoded = self.formatter_output[0]["encoded_item"]
@@ -859,3 +860,52 @@ class NTBNITFFormatterTest(TestCase):
         self.assertEqual(evloc[1].get("county-dist"), "")
         self.assertEqual(evloc[1].get("state-prov"), "Genève")
         self.assertEqual(evloc[1].get("id"), "")
+
+    @mock.patch.dict("superdesk.resources", resources)
+    def test_original_article_untouched(self):
+        article = copy.deepcopy(ARTICLE)
+        self.formatter.format(article, {"name": "Test NTBNITF"})
+        self.assertEqual(ARTICLE, article)
+        self.assertNotIn("_featured", article["associations"]["featuremedia"])
+
+    @mock.patch.dict("superdesk.resources", resources)
+    def test_render_cache(self):
+        render_cache.clear()
+        article = copy.deepcopy(ARTICLE)
+        article["state"] = "published"
+        with mock.patch.object(
+            self.formatter, "get_nitf", wraps=self.formatter.get_nitf
+        ) as get_nitf:
+            first = self.formatter.format(article, {"name": "Foo"})[0]
+            second = self.formatter.format(article, {"name": "Bar"})[0]
+            self.assertEqual(1, get_nitf.call_count)
+            self.assertEqual(first["encoded_item"], second["encoded_item"])
+            self.assertEqual(first["filename"], second["filename"])
+
+            # new version is rendered again
+            article["_current_version"] += 1
+            self.formatter.format(article, {"name": "Foo"})
+            self.assertEqual(2, get_nitf.call_count)
+
+            # items not published yet are not cached
+            article["state"] = "in_progress"
+            self.formatter.format(article, {"name": "Foo"})
+            self.formatter.format(article, {"name": "Foo"})
+            self.assertEqual(4, get_nitf.call_count)
+
+    @mock.patch.dict("superdesk.resources", resources)
+    def test_render_cache_iptc_sequence(self):
+        render_cache.clear()
+        self.app.config["NTB_IPTC_SEQUENCE"] = True
+        article = copy.deepcopy(ARTICLE)
+        article["state"] = "published"
+        with mock.patch.object(
+            self.formatter, "_get_daily_count", side_effect=[10, 11]
+        ):
+            first = self.formatter.format(article, {"name": "Foo"})[0]
+            second = self.formatter.format(article, {"name": "Bar"})[0]
+        for output, count in ((first, "10"), (second, "11")):
+            head = etree.fromstring(output["encoded_item"]).find("head")
+            sequence = head.find('meta[@name="NTBIPTCSequence"]')
+            self.assertEqual(count, sequence.get("content"))
+            self.assertIn(count, output["formatted_item"])
@@ -0,0 +1,25 @@
+from unittest import TestCase
+from ntb.publish.ntb_publish_service import NTBPublishService
+
+FORMATTED_ITEM = """<?xml version="1.0" encoding="iso-8859-1" standalone="yes"?>
+<nitf><head><meta name="filename" content="from-xml.xml"/></head></nitf>"""
+
+
+class NTBPublishServiceTestCase(TestCase):
+    def test_filename_from_queue_item(self):
+        item = {"filename": "from-formatter.xml", "formatted_item": FORMATTED_ITEM}
+        self.assertEqual("from-formatter.xml", NTBPublishService.get_filename(item))
+
+    def test_filename_from_formatted_item(self):
+        item = {"formatted_item": FORMATTED_ITEM}
+        self.assertEqual("from-xml.xml", NTBPublishService.get_filename(item))
+
+    def test_default_filename(self):
+        item = {
+            "item_id": "urn:foo",
+            "item_version": 2,
+            "published_seq_num": 3,
+            "formatted_item": "{}",
+            "destination": {"format": "foo", "config": {"file_extension": "txt"}},
+        }
+        self.assertEqual("urn-foo-2-3.txt", NTBPublishService.get_filename(item))
@@ -0,0 +1,68 @@
+import time
+import flask
+import unittest
+
+from ntb.publish import timings
+
+
+class TimingsTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = flask.Flask(__name__)
+        self.app.config[timings.CONFIG_KEY] = True
+        self.ctx = self.app.app_context()
+        self.ctx.push()
+
+    def tearDown(self):
+        self.ctx.pop()
+
+    def test_stages(self):
+        with self.assertLogs(timings.logger, "INFO") as logs:
+            with timings.item("ntbnitf10", "foo") as item_timings:
+                with timings.stage(timings.METADATA):
+                    time.sleep(0.01)
+                    with timings.stage(timings.DB):
+                        time.sleep(0.1)
+                with timings.stage(timings.DB):
+                    time.sleep(0.01)
+        self.assertIsNone(timings.current())
+        self.assertEqual({timings.METADATA, timings.DB}, set(item_timings.stages))
+        # nested stage time is not included
+        self.assertLess(item_timings.stages[timings.METADATA], 0.1)
+        self.assertGreaterEqual(item_timings.stages[timings.DB], 0.11)
+        self.assertGreaterEqual(item_timings.total, sum(item_timings.stages.values()))
+
+        self.assertEqual(1, len(logs.output))
+        self.assertIn("ntbnitf10 item=foo total=", logs.output[0])
+        self.assertIn(" metadata=", logs.output[0])
+        self.assertIn(" db=", logs.output[0])
+        self.assertIn(" other=", logs.output[0])
+
+    def test_nested_item(self):
+        with timings.item("outer", "foo") as outer:
+            with timings.item("inner", "bar"):
+                with timings.stage(timings.BODY):
+                    pass
+        self.assertIn(timings.BODY, outer.stages)
+
+    def test_disabled(self):
+        self.app.config[timings.CONFIG_KEY] = False
+        with timings.item("ntbnitf10", "foo") as item_timings:
+            self.assertIsNone(item_timings)
+            self.assertIsNone(timings.current())
+            with timings.stage(timings.BODY):
+                pass
+
+    def test_iter_stage(self):
+        def chunks():
+            time.sleep(0.01)
+            yield "foo"
+            time.sleep(0.01)
+            yield "bar"
+
+        with timings.item("ntb_ninjs", "foo") as item_timings:
+            self.assertEqual(["foo", "bar"], list(timings.iter_stage(timings.SERIALISE, chunks())))
+        self.assertGreaterEqual(item_timings.stages[timings.SERIALISE], 0.02)
+
+        # generator is used as is when item is not timed
+        generator = chunks()
+        self.assertIs(generator, timings.iter_stage(timings.SERIALISE, generator))
@@ -0,0 +1,91 @@
+import time
+import unittest
+
+from ntb.publish import utils
+
+
+def embed(id_, content="<figure></figure>", type_="Image"):
+    label = '%s {id: "%s"}' % (type_, id_)
+    return "<!-- EMBED START {label} -->{content}<!-- EMBED END {label} -->".format(
+        label=label, content=content
+    )
+
+
+class FormatBodyContentTestCase(unittest.TestCase):
+    def test_embeds(self):
+        associations = {
+            "featuremedia": {"guid": "feature"},
+            "embedded1": {"guid": "embedded1"},
+            "embedded2": {"guid": "embedded2"},
+            "embedded3": None,
+        }
+        article = {
+            "body_html": "<p>a</p>{}<p>b</p>{}{}{}<p>c</p>".format(
+                embed("embedded2", type_="Video"),
+                embed("embedded1"),
+                embed("embedded3"),
+                embed("missing"),
+            ),
+            "associations": associations,
+        }
+        html, media_data = utils.format_body_content(article)
+        self.assertEqual("<p>a</p><p>b</p><p>c</p>", html)
+        self.assertEqual(
+            [
+                utils.Media({"guid": "feature"}, "media"),
+                utils.Media({"guid": "embedded2"}),
+                utils.Media({"guid": "embedded1"}),
+            ],
+            media_data,
+        )
+        # associations are referenced, not copied or modified
+        self.assertIs(associations["featuremedia"], media_data[0].data)
+        self.assertEqual({"guid": "feature"}, associations["featuremedia"])
+
+    def test_feature_image(self):
+        _, media_data = utils.format_body_content(
+            {"associations": {"featureimage": {"guid": "image"}, "featuremedia": {"guid": "media"}}}
+        )
+        self.assertEqual([utils.Media({"guid": "image"}, "image")], media_data)
+
+    def test_embed_removed_up_to_last_end(self):
+        label = 'Image {id: "embedded1"}'
+        html, media_data = utils.format_body_content(
+            {
+                "body_html": "<p>a</p><!-- EMBED START {label} --><p>b</p>"
+                "<!-- EMBED END {label} --><p>c</p><!-- EMBED END {label} --><p>d</p>"
+                "<!-- EMBED START Image {{id: \"unclosed\"}} -->".format(label=label),
+                "associations": {"embedded1": {"guid": "embedded1"}},
+            }
+        )
+        self.assertEqual(
+            '<p>a</p><p>d</p><!-- EMBED START Image {id: "unclosed"} -->', html
+        )
+        self.assertEqual(1, len(media_data))
+
+    def test_chars(self):
+        html, media_data = utils.format_body_content(
+            {"body_html": "<p>a&nbsp;b\x00\x1f\n\tc\x7f</p>{}".format(embed("foo"))}
+        )
+        self.assertEqual("<p>a b\n\tc</p>", html)
+        self.assertEqual([], media_data)
+
+    def test_many_unclosed_embeds(self):
+        body_html = "".join(
+            '<p>a</p><!-- EMBED START Image {id: "embedded%d"} --><p>b</p>' % i
+            for i in range(5000)
+        )
+        start = time.perf_counter()
+        html, _ = utils.format_body_content({"body_html": body_html})
+        self.assertLess(time.perf_counter() - start, 1)
+        self.assertEqual(body_html, html)
+
+    def test_many_unterminated_embed_ids(self):
+        body_html = "".join(
+            '<p>a</p><!-- EMBED START Image {id: "embedded%d --><p>b</p>' % i
+            for i in range(5000)
+        )
+        start = time.perf_counter()
+        html, _ = utils.format_body_content({"body_html": body_html})
+        self.assertLess(time.perf_counter() - start, 1)
+        self.assertEqual(body_html, html)
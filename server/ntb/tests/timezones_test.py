@@ -0,0 +1,46 @@
+import flask
+import pytz
+
+from datetime import datetime
+from unittest import TestCase
+from superdesk.utc import get_date, local_to_utc, utc_to_local
+
+from ntb import timezones
+
+DATES = [
+    "2016-10-31T08:27:25+0000",
+    "2018-03-25T01:30:00+0000",  # DST starts
+    "2018-10-28T00:30:00+0000",  # DST ends
+    "2016-10-31T23:00:00",
+    datetime(2020, 3, 29, 0, 59),
+    datetime(2020, 10, 25, 0, 59, tzinfo=pytz.utc),
+]
+
+
+class TimezonesTestCase(TestCase):
+    def test_get_timezone(self):
+        tz = timezones.get_timezone("Europe/Oslo")
+        self.assertIs(tz, timezones.get_timezone("Europe/Oslo"))
+        self.assertEqual("Europe/Oslo", tz.zone)
+        with self.assertRaises(pytz.UnknownTimeZoneError):
+            timezones.get_timezone("Europe/Nowhere")
+
+    def test_get_default_timezone(self):
+        app = flask.Flask(__name__)
+        app.config["DEFAULT_TIMEZONE"] = "Europe/Prague"
+        with app.app_context():
+            self.assertEqual("Europe/Prague", timezones.get_default_timezone().zone)
+
+    def test_same_as_superdesk(self):
+        for value in DATES:
+            for tz in ("Europe/Oslo", "America/New_York", "UTC"):
+                local = timezones.to_local(value, tz)
+                expected = utc_to_local(tz, get_date(value))
+                self.assertEqual(expected, local)
+                self.assertEqual(expected.utcoffset(), local.utcoffset())
+                self.assertEqual(local_to_utc(tz, get_date(value)), timezones.to_utc(value, tz))
+
+    def test_empty(self):
+        self.assertIsNone(timezones.to_local(None, "Europe/Oslo"))
+        self.assertIsNone(timezones.to_local(DATES[0], None))
+        self.assertIsNone(timezones.to_utc("", "Europe/Oslo"))
@@ -0,0 +1,77 @@
+import flask
+import superdesk
+
+from unittest import TestCase
+from unittest.mock import patch
+
+from ntb import vocabularies
+from ntb.tests.mock import resources
+
+
+class VocabulariesSnapshotTestCase(TestCase):
+    def setUp(self):
+        self.app = flask.Flask(__name__)
+        self.app.config.from_object("settings")
+        self.ctx = self.app.app_context()
+        self.ctx.push()
+        vocabularies.invalidate()
+        self.addCleanup(vocabularies.invalidate)
+
+    def tearDown(self):
+        self.ctx.pop()
+
+    @patch.dict("superdesk.resources", resources)
+    def test_get_items(self):
+        service = superdesk.get_resource_service("vocabularies")
+        with patch.object(service, "find_one", wraps=service.find_one) as find_one:
+            items = vocabularies.get_items("topics")
+            vocabularies.get_items("topics")
+            vocabularies.get_item("topics", "20000550")
+            self.assertEqual(1, find_one.call_count)
+
+        expected = [
+            service.get_article_cv_item(item, "topics")
+            for item in service.find_one(_id="topics")["items"]
+            if item.get("is_active", True)
+        ]
+        self.assertEqual(expected, [dict(item) for item in items])
+        self.assertNotIn("is_active", items[0])
+        self.assertEqual("topics", items[0]["scheme"])
+
+        with self.assertRaises(TypeError):
+            items[0]["name"] = "foo"
+
+    @patch.dict("superdesk.resources", resources)
+    def test_get_by_qcode(self):
+        vocabulary = vocabularies.get_vocabulary("subject_custom")
+        self.assertEqual("Arkeologi", vocabulary.get("01001000")["name"])
+        self.assertEqual(
+            "subject_custom", vocabularies.get_item("subject_custom", "01001000")["scheme"]
+        )
+        self.assertIn("01001000", vocabularies.get_items_by_qcode("subject_custom"))
+        self.assertIsNone(vocabularies.get_item("subject_custom", "foo"))
+
+    @patch.dict("superdesk.resources", resources)
+    def test_missing_vocabulary(self):
+        self.assertIsNone(vocabularies.get_vocabulary("missing"))
+        self.assertEqual((), vocabularies.get_items("missing"))
+        self.assertIsNone(vocabularies.get_item("missing", "foo"))
+
+    @patch.dict("superdesk.resources", resources)
+    def test_invalidate(self):
+        vocabulary = vocabularies.get_vocabulary("categories")
+        self.assertIs(vocabulary, vocabularies.get_vocabulary("categories"))
+        vocabularies.invalidate("categories")
+        self.assertIsNot(vocabulary, vocabularies.get_vocabulary("categories"))
+
+    @patch.dict("superdesk.resources", resources)
+    def test_etag_poll(self):
+        self.app.config[vocabularies.TTL_CONFIG_KEY] = 0
+        service = superdesk.get_resource_service("vocabularies")
+        vocabulary = vocabularies.get_vocabulary("categories")
+        self.assertIs(vocabulary, vocabularies.get_vocabulary("categories"))
+
+        service.vocabularies["categories"]["_etag"] = "changed"
+        updated = vocabularies.get_vocabulary("categories")
+        self.assertIsNot(vocabulary, updated)
+        self.assertEqual(("changed", None), updated.version)
@@ -0,0 +1,67 @@
+"""Timezones and date conversions shared by NTB parsers and formatters.
+
+Same as ``superdesk.utc`` functions, but timezones are resolved by name only
+once and parsed date strings are kept, as the same dates are converted
+many times when formatting or ingesting items.
+"""
+
+import functools
+
+from datetime import datetime
+from typing import Optional
+from flask import current_app as app
+from pytz import BaseTzInfo, timezone, utc
+from superdesk.utc import get_date
+
+DEFAULT_TIMEZONE = "Europe/Oslo"
+
+
+@functools.lru_cache(maxsize=None)
+def get_timezone(name: str) -> BaseTzInfo:
+    """Get timezone by name.
+
+    :raises pytz.UnknownTimeZoneError: if timezone doesn't exist
+    """
+    return timezone(name)
+
+
+def get_default_timezone() -> BaseTzInfo:
+    """Get timezone set by ``DEFAULT_TIMEZONE`` config."""
+    return get_timezone(app.config.get("DEFAULT_TIMEZONE", DEFAULT_TIMEZONE))
+
+
+@functools.lru_cache(maxsize=1024)
+def _parse_date_string(value: str) -> datetime:
+    return get_date(value)
+
+
+def parse_date(value) -> Optional[datetime]:
+    """Parse date, same as ``superdesk.utc.get_date``.
+
+    Datetime values are returned as they are, naive ones are considered UTC.
+    """
+    if isinstance(value, datetime):
+        return value
+    if isinstance(value, str):
+        return _parse_date_string(value)
+    return get_date(value)
+
+
+def to_local(value, tz_name: str) -> Optional[datetime]:
+    """Convert UTC date to timezone, same as ``utc_to_local(tz_name, get_date(value))``."""
+    utc_datetime = parse_date(value)
+    if not utc_datetime or not tz_name:
+        return None
+    if utc_datetime.tzinfo is None:
+        utc_datetime = utc_datetime.replace(tzinfo=utc)
+    tz = get_timezone(tz_name)
+    return tz.normalize(utc_datetime.astimezone(tz))
+
+
+def to_utc(value, tz_name: str) -> Optional[datetime]:
+    """Convert local date to UTC, same as ``local_to_utc(tz_name, get_date(value))``."""
+    local_datetime = parse_date(value)
+    if not local_datetime:
+        return None
+    tz = get_timezone(tz_name)
+    return utc.normalize(tz.localize(local_datetime.replace(tzinfo=None)))
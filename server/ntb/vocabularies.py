@@ -0,0 +1,202 @@
+"""Process-wide snapshots of controlled vocabularies.
+
+Ingest parsers and formatters read vocabularies for every item, so instead
+of fetching those from the database each time we keep a read-only, qcode
+indexed snapshot of every vocabulary used in the worker process.
+
+A snapshot is dropped when the vocabulary is modified via API in this process,
+changes done elsewhere are detected by ``_etag`` poll which is done at most
+every ``VOCABULARIES_SNAPSHOT_TTL`` seconds.
+"""
+
+import json
+import time
+import logging
+import threading
+
+from types import MappingProxyType
+from typing import Dict, Mapping, Optional, Tuple
+from eve.utils import ParsedRequest
+from flask import current_app as app
+from superdesk import get_resource_service
+
+logger = logging.getLogger(__name__)
+
+TTL_CONFIG_KEY = "VOCABULARIES_SNAPSHOT_TTL"
+DEFAULT_TTL = 60  # seconds
+
+
+def _readonly(item) -> Mapping:
+    return MappingProxyType(dict(item))
+
+
+class Vocabulary:
+    """Read-only view of a single vocabulary.
+
+    :param dict cv: vocabulary document
+    """
+
+    def __init__(self, cv):
+        self._id = cv["_id"]
+        self.version = (cv.get("_etag"), cv.get("_updated"))
+
+        #: all vocabulary items, as stored in the vocabulary
+        self.items: Tuple[Mapping, ...] = tuple(
+            _readonly(item) for item in cv.get("items") or []
+        )
+
+        #: active items formatted for article, same as ``VocabulariesService.get_items``
+        self.cv_items: Tuple[Mapping, ...] = tuple(
+            _readonly(
+                dict(
+                    {k: v for k, v in item.items() if k != "is_active"},
+                    scheme=self._id,
+                )
+            )
+            for item in self.items
+            if item.get("is_active", True)
+        )
+
+        items_by_qcode: Dict[str, Mapping] = {}
+        for item in self.items:
+            items_by_qcode.setdefault(item.get("qcode"), item)
+        self.items_by_qcode: Mapping[str, Mapping] = MappingProxyType(items_by_qcode)
+
+        cv_items_by_qcode: Dict[str, Mapping] = {}
+        for item in self.cv_items:
+            cv_items_by_qcode.setdefault(item.get("qcode"), item)
+        self.cv_items_by_qcode: Mapping[str, Mapping] = MappingProxyType(
+            cv_items_by_qcode
+        )
+
+    def get(self, qcode) -> Optional[Mapping]:
+        """Get vocabulary item by qcode, active or not."""
+        return self.items_by_qcode.get(qcode)
+
+    def get_cv_item(self, qcode) -> Optional[Mapping]:
+        """Get active vocabulary item formatted for article by qcode."""
+        return self.cv_items_by_qcode.get(qcode)
+
+
+class VocabulariesSnapshot:
+    """Registry of vocabulary snapshots for the current process."""
+
+    def __init__(self):
+        self._vocabularies: Dict[str, Optional[Vocabulary]] = {}
+        self._checked_at: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def get(self, _id) -> Optional[Vocabulary]:
+        try:
+            vocabulary = self._vocabularies[_id]
+        except KeyError:
+            return self._load(_id)
+        if time.monotonic() - self._checked_at[_id] > self._ttl():
+            return self._poll(_id, vocabulary)
+        return vocabulary
+
+    def invalidate(self, _id=None) -> None:
+        with self._lock:
+            if _id is None:
+                self._vocabularies.clear()
+                self._checked_at.clear()
+            else:
+                self._vocabularies.pop(_id, None)
+                self._checked_at.pop(_id, None)
+
+    def _ttl(self) -> float:
+        if app.config.get("SUPERDESK_TESTING"):
+            # db is reset between tests, always check the etag
+            return 0
+        return app.config.get(TTL_CONFIG_KEY, DEFAULT_TTL)
+
+    def _load(self, _id) -> Optional[Vocabulary]:
+        cv = get_resource_service("vocabularies").find_one(req=None, _id=_id)
+        vocabulary = Vocabulary(cv) if cv else None
+        with self._lock:
+            self._vocabularies[_id] = vocabulary
+            self._checked_at[_id] = time.monotonic()
+        return vocabulary
+
+    def _poll(self, _id, vocabulary) -> Optional[Vocabulary]:
+        req = ParsedRequest()
+        req.projection = json.dumps({"_etag": 1, "_updated": 1})
+        cv = get_resource_service("vocabularies").find_one(req=req, _id=_id)
+        if cv is None and vocabulary is None:
+            with self._lock:
+                self._checked_at[_id] = time.monotonic()
+            return None
+        if (
+            cv is not None
+            and vocabulary is not None
+            and (cv.get("_etag"), cv.get("_updated")) == vocabulary.version
+        ):
+            with self._lock:
+                self._checked_at[_id] = time.monotonic()
+            return vocabulary
+        logger.debug("vocabulary %s changed, reloading snapshot", _id)
+        return self._load(_id)
+
+
+snapshot = VocabulariesSnapshot()
+
+
+def get_vocabulary(_id) -> Optional[Vocabulary]:
+    """Get vocabulary snapshot, ``None`` if vocabulary doesn't exist."""
+    return snapshot.get(_id)
+
+
+def get_items(_id) -> Tuple[Mapping, ...]:
+    """Get active items formatted for article.
+
+    Same as ``VocabulariesService.get_items`` but read-only,
+    make a copy of an item before adding it to an article.
+    """
+    vocabulary = snapshot.get(_id)
+    if vocabulary is None:
+        return ()
+    return vocabulary.cv_items
+
+
+def get_items_by_qcode(_id) -> Mapping[str, Mapping]:
+    """Get active items formatted for article indexed by qcode."""
+    vocabulary = snapshot.get(_id)
+    if vocabulary is None:
+        return MappingProxyType({})
+    return vocabulary.cv_items_by_qcode
+
+
+def get_item(_id, qcode) -> Optional[Mapping]:
+    """Get active item formatted for article by qcode."""
+    vocabulary = snapshot.get(_id)
+    if vocabulary is None:
+        return None
+    return vocabulary.get_cv_item(qcode)
+
+
+def invalidate(_id=None) -> None:
+    snapshot.invalidate(_id)
+
+
+def _on_updated(updates, original):
+    invalidate(original.get("_id"))
+
+
+def _on_replaced(document, original):
+    invalidate(original.get("_id"))
+
+
+def _on_inserted(docs):
+    for doc in docs:
+        invalidate(doc.get("_id"))
+
+
+def _on_deleted(doc):
+    invalidate(doc.get("_id"))
+
+
+def init_app(app):
+    app.on_updated_vocabularies += _on_updated
+    app.on_replaced_vocabularies += _on_replaced
+    app.on_inserted_vocabularies += _on_inserted
+    app.on_deleted_item_vocabularies += _on_deleted
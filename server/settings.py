@@ -45,6 +45,10 @@ INSTALLED_APPS = [
     "ntb.publish",
     "ntb.ping_scanpix",
     "ntb.mediatopics_to_subject_mapping",
+    "ntb.vocabularies",
+    "ntb.content_profiles",
+    "ntb.contacts",
+    "ntb.publish.planning_ids",
     "superdesk.users",
     "superdesk.upload",
     "superdesk.sequences",
@@ -304,4 +308,16 @@ INGEST_DEFAULT_BODY_FOOTER = "(©NTB)"
 
 NTB_IPTC_SEQUENCE = strtobool(env("NTB_IPTC_SEQUENCE", "off"))
 
+#: log time spent in formatting stages for every formatted item
+NTB_FORMATTER_TIMINGS = strtobool(env("NTB_FORMATTER_TIMINGS", "off"))
+
+#: how often (in seconds) are vocabularies snapshots checked for changes
+VOCABULARIES_SNAPSHOT_TTL = int(env("VOCABULARIES_SNAPSHOT_TTL", 60))
+
+#: how often (in seconds) are cached content profiles checked for changes
+CONTENT_PROFILES_CACHE_TTL = int(env("CONTENT_PROFILES_CACHE_TTL", 60))
+
+#: how long (in seconds) are cached contacts used before fetching again
+CONTACTS_CACHE_TTL = int(env("CONTACTS_CACHE_TTL", 60))
+
 OMSETT_API_TOKEN = env("OMSETT_API_TOKEN", "")